@@ -25,6 +25,9 @@ DATA_PATH.mkdir(exist_ok=True)
 OUTPUT_PATH.mkdir(exist_ok=True)
 LOGS_PATH.mkdir(exist_ok=True)
 
+# Parquet cache of parsed Excel reports; disabled unless a directory is configured
+EXCEL_CACHE_PATH = Path(os.environ["EXCEL_CACHE_PATH"]) if os.getenv("EXCEL_CACHE_PATH") else None
+
 # Application Configuration
 APP_NAME = os.getenv("APP_NAME", "Clinical Trial Intelligence Platform")
 
@@ -3,10 +3,13 @@ Main Streamlit Dashboard Application
 Interactive dashboard for the Clinical Trial Intelligence Platform
 """
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+import io
+from csv import DictWriter
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import sys
 
 # Add src to path
@@ -16,7 +19,6 @@ from ingestion import DataIngestionEngine
 from harmonization import CanonicalDataModel
 from metrics import MetricsEngine, DataQualityIndex
 from intelligence import RiskIntelligence
-from ai import GenerativeAI, CRAAgent, DataQualityAgent, TrialManagerAgent
 from config import DATA_PATH, APP_NAME
 
 # Page configuration
@@ -283,6 +285,175 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+@st.cache_resource
+def _gen_ai():
+    """Create the Gemini client once and share it across reruns"""
+    from ai import GenerativeAI
+    return GenerativeAI()
+
+
+class _UncachedResponse(Exception):
+    """Carries a Gemini error or blocked notice out of the cached call"""
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_completion(prompt, system_message):
+    """Memoize Gemini completions on the exact prompt text"""
+    response = _gen_ai()._generate_completion(prompt, system_message)
+    # Error and blocked notices are bracket-prefixed; raising keeps them out of the cache
+    if response.startswith("["):
+        raise _UncachedResponse(response)
+    return response
+
+
+def _completion(prompt, system_message):
+    """
+    Generate a Gemini completion, reusing the answer to an identical prompt
+    
+    Args:
+        prompt: User prompt; metric values in it key the cache
+        system_message: System context message
+        
+    Returns:
+        Generated text
+    """
+    try:
+        return _cached_completion(prompt, system_message)
+    except _UncachedResponse as notice:
+        return notice.args[0]
+
+
+@st.cache_resource
+def _dq_agent():
+    """Create the Data Quality Agent once"""
+    from ai import DataQualityAgent
+    return DataQualityAgent(_gen_ai())
+
+
+@st.cache_resource
+def _tm_agent(study_name):
+    """Create one Trial Manager Agent per study"""
+    from ai import TrialManagerAgent
+    return TrialManagerAgent(study_name, _gen_ai())
+
+
+@st.cache_data
+def _systemic_issues(study_name, subject_df):
+    """Run the Data Quality Agent once per study and subject data"""
+    return _dq_agent().detect_systemic_issues(subject_df)
+
+
+@st.cache_data
+def _milestone_assessment(study_name, summary, milestone_name, milestone_day):
+    """Run the Trial Manager Agent once per study, metrics and milestone day"""
+    from datetime import datetime
+    milestone_date = datetime.combine(milestone_day, datetime.min.time())
+    return _tm_agent(study_name).assess_milestone_risk(summary, milestone_name, milestone_date)
+
+
+# Subject slices reused across renderers: view name -> (column, row predicate)
+SUBJECT_VIEWS = {
+    "high_risk_mask": ("risk_level", lambda s: s.eq("High")),
+    "high_query_mask": ("open_queries", lambda s: s.ge(3))
+}
+
+
+def _attach_subject_views(study_metrics):
+    """Precompute boolean row masks for the subject slices in SUBJECT_VIEWS"""
+    subject_df = study_metrics.get("subject_metrics")
+    if subject_df is not None:
+        study_metrics["_views"] = {
+            name: predicate(subject_df[col]).to_numpy()
+            for name, (col, predicate) in SUBJECT_VIEWS.items()
+            if col in subject_df.columns
+        }
+    return study_metrics
+
+
+def _subject_mask(subject_df, views, name):
+    """Return a precomputed subject mask, computing it if unavailable"""
+    mask = (views or {}).get(name)
+    if mask is None or len(mask) != len(subject_df):
+        col, predicate = SUBJECT_VIEWS[name]
+        mask = predicate(subject_df[col]).to_numpy()
+    return mask
+
+
+def _subject_view(subject_df, views, name):
+    """Select subject rows with a precomputed mask, computing it if unavailable"""
+    return subject_df[_subject_mask(subject_df, views, name)]
+
+
+# CRA overview totals: KPI name -> subject column summed
+CRA_KPI_COLUMNS = {
+    "total_queries": "open_queries",
+    "total_missing_visits": "missing_visits",
+    "clean_subjects": "is_clean_patient"
+}
+
+
+def _cra_kpis(subject_df, views=None):
+    """
+    Compute the CRA overview KPIs in one reduction over the subject columns
+    
+    Args:
+        subject_df: Subject-level metrics
+        views: Precomputed subject masks from _attach_subject_views
+        
+    Returns:
+        Dictionary of KPI totals; KPIs whose column is missing are 0
+    """
+    kpis = dict.fromkeys(CRA_KPI_COLUMNS, 0)
+    present = {kpi: col for kpi, col in CRA_KPI_COLUMNS.items() if col in subject_df.columns}
+    if present:
+        totals = np.nansum(subject_df[list(present.values())].to_numpy(dtype=float), axis=0)
+        kpis.update(zip(present, totals))
+    kpis["high_risk_subjects"] = (
+        int(_subject_mask(subject_df, views, "high_risk_mask").sum()) if "risk_level" in subject_df.columns else 0
+    )
+    return kpis
+
+
+def _present_columns(df, candidates):
+    """Return the candidate columns present in df, in order and without duplicates"""
+    cols_set = frozenset(df.columns)
+    return list(dict.fromkeys(col for col in candidates if col in cols_set))
+
+
+def _float_values(series):
+    """Column values as a float array; entries that are not numbers become NaN"""
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def _topk(df, col, k, largest=False):
+    """
+    Return the k rows with the smallest (or largest) values of a column, in order
+    
+    Uses np.partition so only the k winners are sorted; NaN handling and tie
+    order match DataFrame.nsmallest/nlargest. Non-numeric values rank as NaN.
+    """
+    if k >= len(df):
+        return df.sort_values(col, ascending=not largest, kind="stable", key=lambda s: pd.to_numeric(s, errors="coerce"))
+    values = _float_values(df[col])
+    if largest:
+        values = -values
+    missing = np.isnan(values)
+    candidates = np.flatnonzero(~missing)
+    if k < len(candidates):
+        kth = np.partition(values[candidates], k - 1)[k - 1]
+        candidates = candidates[values[candidates] <= kth]
+    else:
+        # Not enough values: pandas pads the result with the NaN rows
+        candidates = np.arange(len(values))
+    order = np.lexsort((candidates, values[candidates], missing[candidates]))[:k]
+    return df.iloc[candidates[order]]
+
+
+def _top_above(df, col, threshold, k):
+    """Return up to k rows whose column is at least threshold, largest first"""
+    return _topk(df[_float_values(df[col]) >= threshold], col, k, largest=True)
+
+
 @st.cache_data
 def load_and_process_data(_version=5):  # Increment this to bust cache
     """Load and process all clinical trial data"""
@@ -291,11 +462,13 @@ def load_and_process_data(_version=5):  # Increment this to bust cache
         ingestion_engine = DataIngestionEngine(DATA_PATH)
         studies = ingestion_engine.discover_studies()
         
+        # Studies are independent, so load them concurrently (pandas/IO release the GIL)
         all_data = {}
-        for study_name in studies:
-            study_df = ingestion_engine.load_study_data(study_name)
-            if study_df is not None and not study_df.empty:
-                all_data[study_name] = study_df
+        if studies:
+            with ThreadPoolExecutor(max_workers=min(8, len(studies))) as executor:
+                for study_name, study_df in zip(studies, executor.map(ingestion_engine.load_study_data, studies)):
+                    if study_df is not None and not study_df.empty:
+                        all_data[study_name] = study_df
         
         # Check for uploaded data in session state
         if 'uploaded_study_name' in st.session_state and st.session_state.uploaded_study_name:
@@ -310,11 +483,8 @@ def load_and_process_data(_version=5):  # Increment this to bust cache
         
         # Metrics calculation - data already has metrics, just need to format
         metrics_engine = MetricsEngine(canonical_entities, all_data)
-        all_metrics = {}
-        
-        for study_name in all_data.keys():
-            study_metrics = metrics_engine.calculate_all_metrics_for_study(study_name)
-            all_metrics[study_name] = study_metrics
+        with ThreadPoolExecutor(max_workers=min(8, len(all_data))) as executor:
+            all_metrics = dict(zip(all_data, executor.map(metrics_engine.calculate_all_metrics_for_study, all_data)))
         
         # Calculate DQI
         dqi_calculator = DataQualityIndex()
@@ -323,6 +493,7 @@ def load_and_process_data(_version=5):  # Increment this to bust cache
                 metrics["subject_metrics"] = dqi_calculator.calculate_subject_dqi(
                     metrics["subject_metrics"]
                 )
+            _attach_subject_views(metrics)
         
         # Risk intelligence
         risk_engine = RiskIntelligence(all_metrics)
@@ -339,6 +510,7 @@ def render_header():
 
 def render_executive_dashboard(all_metrics, risk_engine):
     """Render executive dashboard view"""
+    import plotly.express as px
     st.header("📊 Executive Dashboard")
     
     if not all_metrics:
@@ -353,14 +525,15 @@ def render_executive_dashboard(all_metrics, risk_engine):
     
     # Calculate portfolio metrics
     all_subject_data = []
-    for study_metrics in all_metrics.values():
+    for study_name, study_metrics in all_metrics.items():
         if "subject_metrics" in study_metrics:
-            all_subject_data.append(study_metrics["subject_metrics"])
+            all_subject_data.append(study_metrics["subject_metrics"].assign(_study=study_name))
     
     if all_subject_data:
         portfolio_df = pd.concat(all_subject_data, ignore_index=True)
         avg_dqi = portfolio_df["dqi_score"].mean() if "dqi_score" in portfolio_df.columns else 0
-        high_risk_count = (portfolio_df["risk_level"] == "High").sum() if "risk_level" in portfolio_df.columns else 0
+        high_risk_mask = portfolio_df["risk_level"].eq("High") if "risk_level" in portfolio_df.columns else 0
+        high_risk_count = high_risk_mask.sum() if "risk_level" in portfolio_df.columns else 0
         clean_count = portfolio_df["is_clean_patient"].sum() if "is_clean_patient" in portfolio_df.columns else 0
         pct_clean = (clean_count / len(portfolio_df) * 100) if len(portfolio_df) > 0 else 0
     else:
@@ -382,21 +555,25 @@ def render_executive_dashboard(all_metrics, risk_engine):
     # Study comparison
     st.subheader("Study Performance Comparison")
     
-    study_summary_data = []
-    for study_name, metrics in all_metrics.items():
-        if "subject_metrics" in metrics:
-            df = metrics["subject_metrics"]
-            summary = {
-                "Study": study_name,
-                "Subjects": len(df),
-                "Avg DQI": df["dqi_score"].mean() if "dqi_score" in df.columns else 0,
-                "High Risk": (df["risk_level"] == "High").sum() if "risk_level" in df.columns else 0,
-                "% Clean": (df["is_clean_patient"].sum() / len(df) * 100) if "is_clean_patient" in df.columns else 0
-            }
-            study_summary_data.append(summary)
-    
-    if study_summary_data:
-        study_summary_df = pd.DataFrame(study_summary_data)
+    if all_subject_data:
+        # One groupby pass over the portfolio instead of a per-study loop
+        study_summary_df = (
+            portfolio_df.assign(
+                _dqi=portfolio_df["dqi_score"] if "dqi_score" in portfolio_df.columns else 0,
+                _high=high_risk_mask,
+                _clean=portfolio_df["is_clean_patient"] if "is_clean_patient" in portfolio_df.columns else 0
+            )
+            .groupby("_study", sort=False)
+            .agg(**{
+                "Subjects": ("_dqi", "size"),
+                "Avg DQI": ("_dqi", "mean"),
+                "High Risk": ("_high", "sum"),
+                "% Clean": ("_clean", "sum")
+            })
+            .rename_axis("Study")
+            .reset_index()
+        )
+        study_summary_df["% Clean"] = study_summary_df["% Clean"] / study_summary_df["Subjects"] * 100
         
         # Bar chart with adjusted width for single study
         fig = px.bar(study_summary_df, x="Study", y="Avg DQI", 
@@ -448,7 +625,10 @@ def render_study_view(all_metrics, risk_engine):
             avg_dqi = subject_df["dqi_score"].mean() if "dqi_score" in subject_df.columns else 0
             st.metric("Avg DQI", f"{avg_dqi:.1f}")
         with col4:
-            high_risk = (subject_df["risk_level"] == "High").sum() if "risk_level" in subject_df.columns else 0
+            high_risk = (
+                _subject_mask(subject_df, study_metrics.get("_views"), "high_risk_mask").sum()
+                if "risk_level" in subject_df.columns else 0
+            )
             st.metric("High Risk", high_risk, delta_color="inverse")
         with col5:
             total_queries = subject_df["open_queries"].sum() if "open_queries" in subject_df.columns else 0
@@ -463,7 +643,7 @@ def render_study_view(all_metrics, risk_engine):
             render_study_metrics(subject_df, study_metrics)
         
         with tab2:
-            render_risk_analysis(subject_df, risk_engine, selected_study)
+            render_risk_analysis(subject_df, risk_engine, selected_study, study_metrics.get("_views"))
         
         with tab3:
             render_site_analysis(subject_df, study_metrics)
@@ -474,6 +654,7 @@ def render_study_view(all_metrics, risk_engine):
 
 def render_study_metrics(subject_df, study_metrics):
     """Render study metrics visualizations"""
+    import plotly.express as px
     st.subheader("Key Metrics")
     
     col1, col2 = st.columns(2)
@@ -519,31 +700,31 @@ def render_study_metrics(subject_df, study_metrics):
             st.plotly_chart(fig, width='stretch')
 
 
-def render_risk_analysis(subject_df, risk_engine, study_name):
+def render_risk_analysis(subject_df, risk_engine, study_name, views=None):
     """Render risk analysis"""
     st.subheader("Risk Analysis")
     
     # High risk subjects
     if "risk_level" in subject_df.columns:
-        high_risk_subjects = subject_df[subject_df["risk_level"] == "High"]
+        high_risk_subjects = _subject_view(subject_df, views, "high_risk_mask")
         
         st.write(f"**High Risk Subjects: {len(high_risk_subjects)}**")
         
         if not high_risk_subjects.empty:
             # Show top 10 by lowest DQI
             if "dqi_score" in high_risk_subjects.columns:
-                top_risk = high_risk_subjects.nsmallest(10, "dqi_score")
+                top_risk = _topk(high_risk_subjects, "dqi_score", 10)
                 
                 display_cols = ["Subject ID", "Site ID", "dqi_score", "risk_level", 
                                "open_queries", "missing_visits", "missing_pages"]
-                display_cols = [col for col in display_cols if col in top_risk.columns]
+                display_cols = _present_columns(top_risk, display_cols)
                 
                 st.dataframe(top_risk[display_cols], use_container_width=True)
         
         # Query hotspots
         st.subheader("Query Hotspots")
         if "Site ID" in subject_df.columns and "open_queries" in subject_df.columns:
-            hotspot_summary = subject_df[subject_df["open_queries"] >= 3].groupby("Site ID").agg({
+            hotspot_summary = _subject_view(subject_df, views, "high_query_mask").groupby("Site ID").agg({
                 "Subject ID": "count",
                 "open_queries": "sum"
             }).reset_index()
@@ -558,6 +739,7 @@ def render_risk_analysis(subject_df, risk_engine, study_name):
 
 def render_site_analysis(subject_df, study_metrics):
     """Render site-level analysis"""
+    import plotly.express as px
     st.subheader("Site Performance")
     
     if "site_metrics" in study_metrics:
@@ -592,7 +774,7 @@ def render_ai_insights(study_name, subject_df, study_metrics):
     }
     
     # Initialize AI
-    gen_ai = GenerativeAI()
+    gen_ai = _gen_ai()
     
     if st.button("Generate Study Summary"):
         with st.spinner("Generating AI summary..."):
@@ -606,8 +788,7 @@ def render_ai_insights(study_name, subject_df, study_metrics):
     
     with col1:
         st.write("**Data Quality Agent**")
-        dq_agent = DataQualityAgent(gen_ai)
-        issues = dq_agent.detect_systemic_issues(subject_df)
+        issues = _systemic_issues(study_name, subject_df)
         
         if issues:
             for issue in issues:
@@ -618,12 +799,10 @@ def render_ai_insights(study_name, subject_df, study_metrics):
     
     with col2:
         st.write("**Trial Manager Agent**")
-        tm_agent = TrialManagerAgent(study_name, gen_ai)
-        
-        from datetime import datetime, timedelta
-        milestone_date = datetime.now() + timedelta(days=60)
+        from datetime import date, timedelta
+        milestone_day = date.today() + timedelta(days=60)
         
-        assessment = tm_agent.assess_milestone_risk(summary, "Database Lock", milestone_date)
+        assessment = _milestone_assessment(study_name, summary, "Database Lock", milestone_day)
         
         risk_color = "🔴" if assessment["risk_level"] == "High" else "🟡" if assessment["risk_level"] == "Medium" else "🟢"
         st.write(f"{risk_color} **Risk Level**: {assessment['risk_level']}")
@@ -667,6 +846,7 @@ def render_cra_dashboard(all_data, all_metrics, canonical_entities, risk_engine)
         safety = study_metrics.get("safety_metrics", {})
         
         col1, col2, col3, col4, col5, col6 = st.columns(6)
+        kpis = _cra_kpis(subject_df, study_metrics.get("_views"))
         
         with col1:
             total_sites = len(site_df)
@@ -677,19 +857,19 @@ def render_cra_dashboard(all_data, all_metrics, canonical_entities, risk_engine)
             st.metric("Total Subjects", total_subjects)
         
         with col3:
-            total_queries = int(subject_df["open_queries"].sum()) if "open_queries" in subject_df.columns else 0
+            total_queries = int(kpis["total_queries"])
             st.metric("Open Queries", total_queries, delta="Urgent" if total_queries > 50 else None)
         
         with col4:
-            total_missing_visits = int(subject_df["missing_visits"].sum()) if "missing_visits" in subject_df.columns else 0
+            total_missing_visits = int(kpis["total_missing_visits"])
             st.metric("Missing Visits", total_missing_visits, delta="Alert" if total_missing_visits > 10 else None)
         
         with col5:
-            high_risk_subjects = (subject_df["risk_level"] == "High").sum() if "risk_level" in subject_df.columns else 0
+            high_risk_subjects = kpis["high_risk_subjects"]
             st.metric("High Risk Subjects", high_risk_subjects, delta_color="inverse")
         
         with col6:
-            clean_pct = (subject_df["is_clean_patient"].sum() / len(subject_df) * 100) if "is_clean_patient" in subject_df.columns and len(subject_df) > 0 else 0
+            clean_pct = (kpis["clean_subjects"] / total_subjects * 100) if total_subjects > 0 else 0
             st.metric("Clean Data Rate", f"{clean_pct:.1f}%")
         
         st.markdown("---")
@@ -707,7 +887,7 @@ def render_cra_dashboard(all_data, all_metrics, canonical_entities, risk_engine)
             render_cra_site_performance(site_df, subject_df, study_data)
         
         with tab2:
-            render_cra_query_management(subject_df, site_df)
+            render_cra_query_management(subject_df, site_df, study_metrics.get("_views"))
         
         with tab3:
             render_cra_visit_compliance(subject_df, site_df)
@@ -721,8 +901,59 @@ def render_cra_dashboard(all_data, all_metrics, canonical_entities, risk_engine)
         st.warning("Required metrics not available for this study.")
 
 
+@st.cache_data
+def _site_performance_figure(site_ids, scores_bytes):
+    """
+    Build the detailed site performance chart
+    
+    Args:
+        site_ids: Tuple of site identifiers
+        scores_bytes: Raw float64 bytes of the matching performance scores
+        
+    Returns:
+        Plotly figure as a dict, cached on the plotted data
+    """
+    import plotly.graph_objects as go
+    
+    # Sort by performance score
+    site_df_sorted = pd.DataFrame({
+        "site_id": site_ids,
+        "performance_score": np.frombuffer(scores_bytes, dtype=float)
+    }).sort_values("performance_score", ascending=False)
+    
+    fig = go.Figure()
+    
+    # Add bar chart
+    fig.add_trace(go.Bar(
+        x=site_df_sorted["site_id"],
+        y=site_df_sorted["performance_score"],
+        name="Performance Score",
+        marker_color=site_df_sorted["performance_score"],
+        marker_colorscale="RdYlGn",
+        text=site_df_sorted["performance_score"].round(1),
+        textposition="outside"
+    ))
+    
+    # Add threshold lines
+    fig.add_hline(y=80, line_dash="dash", line_color="green", 
+                 annotation_text="Target (80)")
+    fig.add_hline(y=60, line_dash="dash", line_color="orange", 
+                 annotation_text="Acceptable (60)")
+    
+    fig.update_layout(
+        title="Site Performance Scores",
+        xaxis_title="Site ID",
+        yaxis_title="Performance Score",
+        yaxis_range=[0, 110],
+        showlegend=False
+    )
+    
+    return fig.to_dict()
+
+
 def render_cra_site_performance(site_df, subject_df, study_data):
     """Render site performance monitoring view"""
+    import plotly.express as px
     st.subheader("🏥 Site Performance Dashboard")
     
     # Site performance summary
@@ -750,59 +981,32 @@ def render_cra_site_performance(site_df, subject_df, study_data):
     with col2:
         st.write("**Top 5 Performing Sites**")
         if "performance_score" in site_df.columns:
-            top_sites = site_df.nlargest(5, "performance_score")[["site_id", "performance_score", "subject_count"]]
+            top_sites = _topk(site_df, "performance_score", 5, largest=True)[["site_id", "performance_score", "subject_count"]]
             st.dataframe(top_sites, hide_index=True, use_container_width=True)
         
         st.write("**Bottom 5 Sites (Need Attention)**")
         if "performance_score" in site_df.columns:
-            bottom_sites = site_df.nsmallest(5, "performance_score")[["site_id", "performance_score", "subject_count"]]
+            bottom_sites = _topk(site_df, "performance_score", 5)[["site_id", "performance_score", "subject_count"]]
             st.dataframe(bottom_sites, hide_index=True, use_container_width=True)
     
     # Detailed site performance chart
     st.write("**Detailed Site Performance**")
     if "performance_score" in site_df.columns:
-        # Sort by performance score
-        site_df_sorted = site_df.sort_values("performance_score", ascending=False)
-        
-        fig = go.Figure()
-        
-        # Add bar chart
-        fig.add_trace(go.Bar(
-            x=site_df_sorted["site_id"],
-            y=site_df_sorted["performance_score"],
-            name="Performance Score",
-            marker_color=site_df_sorted["performance_score"],
-            marker_colorscale="RdYlGn",
-            text=site_df_sorted["performance_score"].round(1),
-            textposition="outside"
-        ))
-        
-        # Add threshold lines
-        fig.add_hline(y=80, line_dash="dash", line_color="green", 
-                     annotation_text="Target (80)")
-        fig.add_hline(y=60, line_dash="dash", line_color="orange", 
-                     annotation_text="Acceptable (60)")
-        
-        fig.update_layout(
-            title="Site Performance Scores",
-            xaxis_title="Site ID",
-            yaxis_title="Performance Score",
-            yaxis_range=[0, 110],
-            showlegend=False
+        fig = _site_performance_figure(
+            tuple(site_df["site_id"]),
+            site_df["performance_score"].to_numpy(dtype=float).tobytes()
         )
-        
         st.plotly_chart(fig, width='stretch')
     
     # Site details table
     st.write("**Complete Site Metrics**")
     display_cols = ["site_id", "subject_count", "total_missing_visits", "total_missing_pages", 
                    "total_open_queries", "performance_score"]
-    display_cols = [col for col in display_cols if col in site_df.columns]
+    display_cols = _present_columns(site_df, display_cols)
     
     # Add styling
-    styled_site_df = site_df[display_cols].copy()
     st.dataframe(
-        styled_site_df,
+        site_df[display_cols],
         width='stretch',
         hide_index=True,
         column_config={
@@ -816,8 +1020,68 @@ def render_cra_site_performance(site_df, subject_df, study_data):
     )
 
 
-def render_cra_query_management(subject_df, site_df):
+def _csv_bytes(df):
+    """Write a frame as UTF-8 CSV bytes, streamed through a buffer in chunks"""
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, encoding="utf-8", lineterminator="\n")
+    return buffer.getvalue()
+
+
+@st.cache_data(show_spinner=False)
+def _export_bytes(df, fmt):
+    """
+    Serialize a frame for download, reused across repeated export clicks
+    
+    Args:
+        df: DataFrame to export
+        fmt: "csv" for gzip-compressed CSV or "parquet" for zstd Parquet
+        
+    Returns:
+        Encoded file bytes
+    """
+    buffer = io.BytesIO()
+    if fmt == "parquet":
+        df.to_parquet(buffer, engine="pyarrow", compression="zstd", index=False)
+    else:
+        df.to_csv(buffer, index=False, encoding="utf-8", lineterminator="\n",
+                  compression={"method": "gzip", "mtime": 0})
+    return buffer.getvalue()
+
+
+def _metrics_downloads(df, file_stem):
+    """Offer a metrics frame as gzip CSV and, when Arrow can type it, as Parquet"""
+    st.download_button(
+        label="Download CSV (gzip)",
+        data=_export_bytes(df, "csv"),
+        file_name=f"{file_stem}.csv.gz",
+        mime="application/gzip"
+    )
+    try:
+        parquet = _export_bytes(df, "parquet")
+    except (TypeError, ValueError):
+        # Free-form uploads can leave mixed-type object columns with no Arrow type
+        return
+    st.download_button(
+        label="Download Parquet",
+        data=parquet,
+        file_name=f"{file_stem}.parquet",
+        mime="application/vnd.apache.parquet"
+    )
+
+
+def _query_download(df):
+    """Render the query report download button"""
+    st.download_button(
+        label="📥 Download Query Report",
+        data=_csv_bytes(df),
+        file_name=f"high_query_subjects_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv"
+    )
+
+
+def render_cra_query_management(subject_df, site_df, views=None):
     """Render query management and tracking"""
+    import plotly.express as px
     st.subheader("📝 Query Management Dashboard")
     
     if "open_queries" not in subject_df.columns:
@@ -850,7 +1114,7 @@ def render_cra_query_management(subject_df, site_df):
         st.write("**Query Burden by Site**")
         if "site_id" in subject_df.columns or "Site ID" in subject_df.columns:
             site_col = "site_id" if "site_id" in subject_df.columns else "Site ID"
-            query_by_site = subject_df.groupby(site_col)["open_queries"].sum().sort_values(ascending=False)
+            query_by_site = subject_df.groupby(site_col, observed=True)["open_queries"].sum().sort_values(ascending=False)
             
             fig = px.bar(
                 x=query_by_site.index,
@@ -864,20 +1128,20 @@ def render_cra_query_management(subject_df, site_df):
         st.write("**Query Hotspots (Sites with High Query Load)**")
         if "site_id" in subject_df.columns or "Site ID" in subject_df.columns:
             site_col = "site_id" if "site_id" in subject_df.columns else "Site ID"
-            query_hotspots = subject_df.groupby(site_col).agg({
+            query_hotspots = subject_df.groupby(site_col, observed=True).agg({
                 "open_queries": ["sum", "mean", "count"]
             }).round(2)
             query_hotspots.columns = ["Total Queries", "Avg per Subject", "Subject Count"]
-            query_hotspots = query_hotspots.sort_values("Total Queries", ascending=False).head(10)
+            query_hotspots = _topk(query_hotspots, "Total Queries", 10, largest=True)
             st.dataframe(query_hotspots, use_container_width=True)
     
     # Subjects with high query burden
     st.write("**Subjects Requiring Immediate Attention (≥3 Open Queries)**")
-    high_query_subjects = subject_df[subject_df["open_queries"] >= 3].copy()
+    high_query_subjects = _subject_view(subject_df, views, "high_query_mask")
     
     if not high_query_subjects.empty:
         display_cols = ["Subject ID", "Site ID", "site_id", "open_queries", "missing_visits", "missing_pages", "risk_level"]
-        display_cols = [col for col in display_cols if col in high_query_subjects.columns]
+        display_cols = _present_columns(high_query_subjects, display_cols)
         
         # Use first available
         if "Subject ID" not in display_cols and "subject_id" in high_query_subjects.columns:
@@ -894,19 +1158,14 @@ def render_cra_query_management(subject_df, site_df):
         )
         
         # Download button
-        csv = high_query_subjects_sorted.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Query Report",
-            data=csv,
-            file_name=f"high_query_subjects_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+        _query_download(high_query_subjects_sorted)
     else:
         st.success("✅ No subjects with high query burden")
 
 
 def render_cra_visit_compliance(subject_df, site_df):
     """Render visit compliance monitoring"""
+    import plotly.express as px
     st.subheader("📅 Visit Compliance Monitoring")
     
     if "missing_visits" not in subject_df.columns:
@@ -938,11 +1197,11 @@ def render_cra_visit_compliance(subject_df, site_df):
     with col1:
         st.write("**Missing Visits by Site**")
         if "total_missing_visits" in site_df.columns:
-            sites_with_issues = site_df[site_df["total_missing_visits"] > 0].sort_values("total_missing_visits", ascending=False)
+            sites_with_issues = _topk(site_df[site_df["total_missing_visits"] > 0], "total_missing_visits", 15, largest=True)
             
             if not sites_with_issues.empty:
                 fig = px.bar(
-                    sites_with_issues.head(15),
+                    sites_with_issues,
                     x="site_id",
                     y="total_missing_visits",
                     title="Top 15 Sites by Missing Visits",
@@ -993,10 +1252,9 @@ def render_cra_visit_compliance(subject_df, site_df):
     critical_subjects = subject_df[subject_df["missing_visits"] >= 2].copy()
     
     if not critical_subjects.empty:
-        display_cols = []
-        for col in ["subject_id", "Subject ID", "site_id", "Site ID", "missing_visits", "missing_pages", "open_queries"]:
-            if col in critical_subjects.columns and col not in display_cols:
-                display_cols.append(col)
+        display_cols = _present_columns(critical_subjects, [
+            "subject_id", "Subject ID", "site_id", "Site ID", "missing_visits", "missing_pages", "open_queries"
+        ])
         
         critical_subjects_sorted = critical_subjects[display_cols].sort_values("missing_visits", ascending=False)
         
@@ -1009,32 +1267,46 @@ def render_cra_visit_compliance(subject_df, site_df):
         st.success("✅ No subjects with multiple missing visits")
 
 
+# Urgency score inputs: site column -> default when the column is missing
+URGENCY_COLUMNS = {
+    "total_missing_visits": 0,
+    "total_open_queries": 0,
+    "performance_score": 100
+}
+
+
 def render_cra_action_items(subject_df, site_df, study_metrics, risk_engine, study_name):
     """Render CRA action items and recommendations"""
     st.subheader("⚠️ Action Items & Recommendations")
     
+    # High-risk mask shared by the subject list and the exports
+    high_risk_mask = (
+        _subject_mask(subject_df, study_metrics.get("_views"), "high_risk_mask")
+        if "risk_level" in subject_df.columns else None
+    )
+    
     # Priority sites for monitoring visits
     st.write("### 🎯 Priority Sites for Monitoring Visits")
     
+    site_priorities = site_df.iloc[:0]
     if "performance_score" in site_df.columns:
         # Calculate urgency score for each site
-        site_priorities = site_df.copy()
-        
-        # Urgency calculation
-        site_priorities["urgency_score"] = (
-            site_priorities.get("total_missing_visits", 0) * 5 +
-            site_priorities.get("total_open_queries", 0) * 2 +
-            (100 - site_priorities.get("performance_score", 100))
+        missing_visits, open_queries, performance = (
+            site_df[col].to_numpy(dtype=float) if col in site_df.columns else np.full(len(site_df), default)
+            for col, default in URGENCY_COLUMNS.items()
         )
+        urgency = missing_visits * 5 + open_queries * 2 + (100 - performance)
         
-        site_priorities = site_priorities.sort_values("urgency_score", ascending=False)
+        # Most urgent first; only the rows shown or exported are materialized
+        order = np.argsort(-urgency, kind="stable")[:20]
+        site_priorities = site_df.iloc[order].assign(urgency_score=urgency[order])
         
         # Top 10 priority sites
         priority_sites = site_priorities.head(10)
         
         display_cols = ["site_id", "subject_count", "total_missing_visits", "total_open_queries", 
                        "performance_score", "urgency_score"]
-        display_cols = [col for col in display_cols if col in priority_sites.columns]
+        display_cols = _present_columns(priority_sites, display_cols)
         
         st.dataframe(
             priority_sites[display_cols],
@@ -1065,16 +1337,18 @@ def render_cra_action_items(subject_df, site_df, study_metrics, risk_engine, stu
         
         # Sites needing query resolution
         if "total_open_queries" in site_df.columns:
-            high_query_sites = site_df[site_df["total_open_queries"] >= 10].sort_values("total_open_queries", ascending=False)
+            high_query_sites = _top_above(site_df, "total_open_queries", 10, 5)
             
             if not high_query_sites.empty:
-                for idx, site in high_query_sites.head(5).iterrows():
+                for site in high_query_sites.to_dict("records"):
                     with st.expander(f"🏥 Site {site['site_id']} - {int(site['total_open_queries'])} queries"):
-                        st.write(f"**Priority:** High")
-                        st.write(f"**Subject Count:** {int(site.get('subject_count', 0))}")
-                        st.write(f"**Action:** Schedule query resolution session")
-                        st.write(f"**Timeline:** Within 1 week")
-                        st.write(f"**Impact:** Database lock timeline at risk")
+                        st.markdown(
+                            f"**Priority:** High\n\n"
+                            f"**Subject Count:** {int(site.get('subject_count', 0))}\n\n"
+                            f"**Action:** Schedule query resolution session\n\n"
+                            f"**Timeline:** Within 1 week\n\n"
+                            f"**Impact:** Database lock timeline at risk"
+                        )
             else:
                 st.success("✅ No sites with high query burden")
     
@@ -1083,36 +1357,38 @@ def render_cra_action_items(subject_df, site_df, study_metrics, risk_engine, stu
         
         # Sites needing visit follow-up
         if "total_missing_visits" in site_df.columns:
-            missing_visit_sites = site_df[site_df["total_missing_visits"] >= 5].sort_values("total_missing_visits", ascending=False)
+            missing_visit_sites = _top_above(site_df, "total_missing_visits", 5, 5)
             
             if not missing_visit_sites.empty:
-                for idx, site in missing_visit_sites.head(5).iterrows():
+                for site in missing_visit_sites.to_dict("records"):
                     with st.expander(f"🏥 Site {site['site_id']} - {int(site['total_missing_visits'])} missing visits"):
-                        st.write(f"**Priority:** High")
-                        st.write(f"**Subject Count:** {int(site.get('subject_count', 0))}")
-                        st.write(f"**Action:** Contact site coordinator to schedule overdue visits")
-                        st.write(f"**Timeline:** Immediate")
-                        st.write(f"**Impact:** Data completeness at risk")
+                        st.markdown(
+                            f"**Priority:** High\n\n"
+                            f"**Subject Count:** {int(site.get('subject_count', 0))}\n\n"
+                            f"**Action:** Contact site coordinator to schedule overdue visits\n\n"
+                            f"**Timeline:** Immediate\n\n"
+                            f"**Impact:** Data completeness at risk"
+                        )
             else:
                 st.success("✅ No sites with significant missing visits")
     
     # High-risk subjects requiring attention
     st.write("### 🚨 High-Risk Subjects Requiring Attention")
     
-    if "risk_level" in subject_df.columns:
-        high_risk = subject_df[subject_df["risk_level"] == "High"].copy()
+    if high_risk_mask is not None:
+        high_risk = subject_df[high_risk_mask]
         
         if not high_risk.empty:
             # Get columns that exist
-            display_cols = []
-            for col in ["subject_id", "Subject ID", "site_id", "Site ID", "dqi_score", 
-                       "open_queries", "missing_visits", "missing_pages"]:
-                if col in high_risk.columns:
-                    display_cols.append(col)
+            display_cols = _present_columns(high_risk, [
+                "subject_id", "Subject ID", "site_id", "Site ID", "dqi_score",
+                "open_queries", "missing_visits", "missing_pages"
+            ])
             
-            high_risk_sorted = high_risk[display_cols].sort_values(
-                "dqi_score" if "dqi_score" in display_cols else display_cols[0]
-            ).head(15)
+            if "dqi_score" in display_cols:
+                high_risk_sorted = _topk(high_risk[display_cols], "dqi_score", 15)
+            else:
+                high_risk_sorted = high_risk[display_cols].sort_values(display_cols[0]).head(15)
             
             st.dataframe(
                 high_risk_sorted,
@@ -1128,29 +1404,39 @@ def render_cra_action_items(subject_df, site_df, study_metrics, risk_engine, stu
     st.markdown("---")
     st.write("### 📥 Export Action Items")
     
+    _export_action_items(site_priorities, site_df, subject_df, high_risk_mask, study_name)
+
+
+@st.fragment
+def _export_action_items(site_priorities, site_df, subject_df, high_risk_mask, study_name):
+    """Render the action item export buttons in their own fragment"""
+    from datetime import date
+    
+    # Date stamp shared by all export file names
+    today = date.today().strftime("%Y%m%d")
     col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("Export Priority Sites"):
             if "urgency_score" in site_priorities.columns:
-                csv = site_priorities.head(20).to_csv(index=False)
+                csv = _csv_bytes(site_priorities.head(20))
                 st.download_button(
                     label="Download CSV",
                     data=csv,
-                    file_name=f"priority_sites_{study_name}_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
+                    file_name=f"priority_sites_{study_name}_{today}.csv",
                     mime="text/csv"
                 )
     
     with col2:
         if st.button("Export High-Risk Subjects"):
-            if "risk_level" in subject_df.columns:
-                high_risk_export = subject_df[subject_df["risk_level"] == "High"]
+            if high_risk_mask is not None:
+                high_risk_export = subject_df[high_risk_mask]
                 if not high_risk_export.empty:
-                    csv = high_risk_export.to_csv(index=False)
+                    csv = _csv_bytes(high_risk_export)
                     st.download_button(
                         label="Download CSV",
                         data=csv,
-                        file_name=f"high_risk_subjects_{study_name}_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
+                        file_name=f"high_risk_subjects_{study_name}_{today}.csv",
                         mime="text/csv"
                     )
     
@@ -1163,21 +1449,25 @@ def render_cra_action_items(subject_df, site_df, study_metrics, risk_engine, stu
                 "Total Subjects": len(subject_df),
                 "Open Queries": int(subject_df["open_queries"].sum()) if "open_queries" in subject_df.columns else 0,
                 "Missing Visits": int(subject_df["missing_visits"].sum()) if "missing_visits" in subject_df.columns else 0,
-                "High Risk Subjects": (subject_df["risk_level"] == "High").sum() if "risk_level" in subject_df.columns else 0,
+                "High Risk Subjects": int(high_risk_mask.sum()) if high_risk_mask is not None else 0,
             }
             
-            report_df = pd.DataFrame([report_data])
-            csv = report_df.to_csv(index=False)
+            buffer = io.StringIO()
+            writer = DictWriter(buffer, fieldnames=list(report_data), lineterminator="\n")
+            writer.writeheader()
+            writer.writerow(report_data)
+            csv = buffer.getvalue().encode("utf-8")
             st.download_button(
                 label="Download CSV",
                 data=csv,
-                file_name=f"cra_summary_{study_name}_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
+                file_name=f"cra_summary_{study_name}_{today}.csv",
                 mime="text/csv"
             )
 
 
 def render_cra_analytics(subject_df, site_df, study_metrics):
     """Render advanced analytics for CRA"""
+    import plotly.express as px
     st.subheader("📊 Advanced Analytics")
     
     # Correlation analysis
@@ -1189,11 +1479,12 @@ def render_cra_analytics(subject_df, site_df, study_metrics):
         st.write("**Query vs. Performance Relationship**")
         if all(col in site_df.columns for col in ["total_open_queries", "performance_score"]):
             fig = px.scatter(
-                site_df,
+                site_df[["total_open_queries", "performance_score", "subject_count", "site_id"]],
                 x="total_open_queries",
                 y="performance_score",
                 size="subject_count",
                 hover_data=["site_id"],
+                render_mode="webgl",
                 title="Site Performance vs Query Burden",
                 labels={"total_open_queries": "Total Open Queries", "performance_score": "Performance Score"}
             )
@@ -1203,11 +1494,12 @@ def render_cra_analytics(subject_df, site_df, study_metrics):
         st.write("**Missing Visits vs. Performance**")
         if all(col in site_df.columns for col in ["total_missing_visits", "performance_score"]):
             fig = px.scatter(
-                site_df,
+                site_df[["total_missing_visits", "performance_score", "subject_count", "site_id"]],
                 x="total_missing_visits",
                 y="performance_score",
                 size="subject_count",
                 hover_data=["site_id"],
+                render_mode="webgl",
                 title="Site Performance vs Missing Visits",
                 labels={"total_missing_visits": "Total Missing Visits", "performance_score": "Performance Score"}
             )
@@ -1230,15 +1522,10 @@ def render_cra_analytics(subject_df, site_df, study_metrics):
     st.write("### 📉 Performance Metrics Summary")
     
     if "performance_score" in site_df.columns:
+        stats = site_df["performance_score"].agg(["mean", "median", "min", "max", "std"])
         perf_stats = {
             "Metric": ["Mean Performance", "Median Performance", "Min Performance", "Max Performance", "Std Dev"],
-            "Value": [
-                f"{site_df['performance_score'].mean():.1f}",
-                f"{site_df['performance_score'].median():.1f}",
-                f"{site_df['performance_score'].min():.1f}",
-                f"{site_df['performance_score'].max():.1f}",
-                f"{site_df['performance_score'].std():.1f}"
-            ]
+            "Value": [f"{value:.1f}" for value in stats]
         }
         
         perf_stats_df = pd.DataFrame(perf_stats)
@@ -1248,12 +1535,12 @@ def render_cra_analytics(subject_df, site_df, study_metrics):
     st.write("### 🏆 Site Performance Ranking")
     
     if "performance_score" in site_df.columns:
-        ranked_sites = site_df.sort_values("performance_score", ascending=False).reset_index(drop=True)
-        ranked_sites.index = ranked_sites.index + 1
-        ranked_sites.index.name = "Rank"
-        
         display_cols = ["site_id", "subject_count", "performance_score", "total_open_queries", "total_missing_visits"]
-        display_cols = [col for col in display_cols if col in ranked_sites.columns]
+        display_cols = _present_columns(site_df, display_cols)
+        
+        # Every site is ranked, so the lowest performers stay visible
+        ranked_sites = site_df[display_cols].sort_values("performance_score", ascending=False, kind="stable")
+        ranked_sites.index = pd.RangeIndex(1, len(ranked_sites) + 1, name="Rank")
         
         st.dataframe(
             ranked_sites[display_cols],
@@ -1269,6 +1556,74 @@ def render_cra_analytics(subject_df, site_df, study_metrics):
         )
 
 
+# Critical action fields: output key -> (subject column, default when missing)
+CRITICAL_ACTION_FIELDS = {
+    "subject": ("subject_id", "N/A"),
+    "site": ("site_id", "N/A"),
+    "dqi": ("dqi", 0),
+    "issues": ("open_queries", 0)
+}
+
+
+def _critical_items(all_metrics):
+    """
+    Collect high-risk subjects across all studies, five per study
+    
+    Args:
+        all_metrics: Metrics for every loaded study
+        
+    Returns:
+        DataFrame with a study column plus the CRITICAL_ACTION_FIELDS keys
+    """
+    critical_blocks = []
+    
+    for study_name, metrics in all_metrics.items():
+        if "subject_metrics" in metrics:
+            subject_df = metrics["subject_metrics"]
+            if "risk_level" in subject_df.columns:
+                high_risk = _subject_view(subject_df, metrics.get("_views"), "high_risk_mask").head(5)
+                critical_blocks.append(pd.DataFrame({
+                    "study": study_name,
+                    **{
+                        key: high_risk[col].to_numpy() if col in high_risk.columns else default
+                        for key, (col, default) in CRITICAL_ACTION_FIELDS.items()
+                    }
+                }, index=range(len(high_risk))))
+    
+    return pd.concat(critical_blocks, ignore_index=True) if critical_blocks else pd.DataFrame()
+
+
+def _critical_items_context(critical_df):
+    """Build the action plan context from the ten leading critical items"""
+    context = "High-Risk Items:\n"
+    for action in critical_df.head(10).to_dict("records"):
+        context += f"- Study {action['study']}, Subject {action['subject']}, Site {action['site']}: DQI={action['dqi']:.1f}, Issues={action['issues']}\n"
+    return context
+
+
+def _portfolio_summary(all_metrics):
+    """
+    Collect per-study portfolio figures in a single pass over the metrics
+    
+    Args:
+        all_metrics: Dictionary mapping study names to study metrics
+        
+    Returns:
+        DataFrame with one row per study
+    """
+    return pd.DataFrame.from_records([
+        {
+            "subjects": len(m.get("subject_metrics", [])),
+            "sites": len(m.get("site_metrics", [])),
+            "total_subjects": m.get("total_subjects", 0),
+            "total_open_queries": m.get("total_open_queries", 0),
+            "avg_completeness": m.get("avg_completeness", 0),
+            "avg_dqi": m.get("avg_dqi", 0)
+        }
+        for m in all_metrics.values()
+    ], index=list(all_metrics))
+
+
 def render_ai_insights_page(all_data, all_metrics, risk_engine):
     """Render dedicated AI Insights page with actionable recommendations"""
     st.header("🤖 AI-Powered Actionable Insights")
@@ -1279,7 +1634,10 @@ def render_ai_insights_page(all_data, all_metrics, risk_engine):
         return
     
     # Initialize Generative AI
-    gen_ai = GenerativeAI()
+    gen_ai = _gen_ai()
+    
+    # Per-study figures collected in one pass, reduced per tab below
+    portfolio = _portfolio_summary(all_metrics)
     
     # Tabs for different insight types
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
@@ -1304,15 +1662,18 @@ def render_ai_insights_page(all_data, all_metrics, risk_engine):
         st.subheader("Portfolio Metrics at a Glance")
         
         total_studies = len(all_metrics)
-        total_subjects = sum(m.get("subject_metrics", pd.DataFrame()).shape[0] for m in all_metrics.values())
-        total_sites = sum(len(m.get("site_metrics", [])) for m in all_metrics.values())
+        total_subjects = portfolio["subjects"].sum().item()
+        total_sites = portfolio["sites"].sum().item()
         
         # Calculate average DQI across all subjects
-        all_dqi_scores = []
-        for m in all_metrics.values():
-            if "subject_metrics" in m and "dqi_score" in m["subject_metrics"].columns:
-                all_dqi_scores.extend(m["subject_metrics"]["dqi_score"].dropna().tolist())
-        avg_dqi = sum(all_dqi_scores) / len(all_dqi_scores) if all_dqi_scores else 0
+        dqi_arrays = [
+            m["subject_metrics"]["dqi_score"].to_numpy(dtype=float, na_value=np.nan)
+            for m in all_metrics.values()
+            if "subject_metrics" in m and "dqi_score" in m["subject_metrics"].columns
+        ]
+        all_dqi_scores = np.concatenate(dqi_arrays) if dqi_arrays else np.array([])
+        all_dqi_scores = all_dqi_scores[~np.isnan(all_dqi_scores)]
+        avg_dqi = float(all_dqi_scores.mean()) if all_dqi_scores.size else 0
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -1328,33 +1689,15 @@ def render_ai_insights_page(all_data, all_metrics, risk_engine):
         st.subheader("⚠️ Critical Actions Required")
         st.markdown("*Top priority items requiring immediate attention*")
         
-        # Collect high-risk entities across all studies
-        critical_actions = []
+        critical_df = _critical_items(all_metrics)
         
-        for study_name, metrics in all_metrics.items():
-            if "subject_metrics" in metrics:
-                subject_df = metrics["subject_metrics"]
-                high_risk = subject_df[subject_df["risk_level"] == "High"] if "risk_level" in subject_df.columns else pd.DataFrame()
-                
-                if not high_risk.empty:
-                    for _, row in high_risk.head(5).iterrows():
-                        critical_actions.append({
-                            "study": study_name,
-                            "subject": row.get("subject_id", "N/A"),
-                            "site": row.get("site_id", "N/A"),
-                            "dqi": row.get("dqi", 0),
-                            "issues": row.get("open_queries", 0)
-                        })
-        
-        if critical_actions:
-            st.warning(f"🚨 Found {len(critical_actions)} high-risk items requiring immediate action")
+        if not critical_df.empty:
+            st.warning(f"🚨 Found {len(critical_df)} high-risk items requiring immediate action")
             
             if st.button("Generate Action Plan", key="action_plan"):
                 with st.spinner("Generating prioritized action plan with Gemini AI..."):
                     # Build context for AI
-                    context = "High-Risk Items:\n"
-                    for action in critical_actions[:10]:  # Top 10
-                        context += f"- Study {action['study']}, Subject {action['subject']}, Site {action['site']}: DQI={action['dqi']:.1f}, Issues={action['issues']}\n"
+                    context = _critical_items_context(critical_df)
                     
                     prompt = f"""Analyze these high-risk clinical trial subjects and provide:
 1. Top 3 most urgent actions (be specific)
@@ -1366,7 +1709,7 @@ def render_ai_insights_page(all_data, all_metrics, risk_engine):
 Provide actionable, prioritized recommendations."""
                     
                     system_message = "You are a clinical operations director creating action plans for quality improvement."
-                    action_plan = gen_ai._generate_completion(prompt, system_message)
+                    action_plan = _completion(prompt, system_message)
                     
                     st.success("✅ Action Plan Generated")
                     st.markdown(f"### Recommended Actions\n\n{action_plan}")
@@ -1374,7 +1717,6 @@ Provide actionable, prioritized recommendations."""
             # Display critical items table
             st.markdown("---")
             st.subheader("Critical Items Detail")
-            critical_df = pd.DataFrame(critical_actions)
             st.dataframe(critical_df, use_container_width=True)
         else:
             st.success("✅ No critical high-risk items found. Portfolio is performing well!")
@@ -1428,7 +1770,7 @@ Provide:
 
 Be specific and actionable."""
                                 
-                                recommendations = gen_ai._generate_completion(
+                                recommendations = _completion(
                                     prompt,
                                     "You are a clinical trial quality improvement consultant."
                                 )
@@ -1463,7 +1805,7 @@ Be specific and actionable."""
             with st.spinner(f"Running {analysis_type} with Gemini AI..."):
                 # Collect relevant data based on analysis type
                 if analysis_type == "Query Hotspot Analysis":
-                    total_queries = sum(m.get("total_open_queries", 0) for m in all_metrics.values())
+                    total_queries = portfolio["total_open_queries"].sum().item()
                     context = f"Total open queries across portfolio: {total_queries}\n"
                     
                     prompt = f"""{context}\nAnalyze query patterns and identify:
@@ -1481,7 +1823,7 @@ Identify:
 4. Best practices to replicate"""
                 
                 elif analysis_type == "Data Completeness Trends":
-                    avg_completeness = sum(m.get("avg_completeness", 0) for m in all_metrics.values()) / len(all_metrics) if all_metrics else 0
+                    avg_completeness = portfolio["avg_completeness"].mean().item()
                     prompt = f"""Portfolio average completeness: {avg_completeness:.1f}%\n
 Provide:
 1. Assessment of completeness status
@@ -1497,7 +1839,7 @@ Provide:
 
 Provide actionable insights on which factors to prioritize."""
                 
-                analysis = gen_ai._generate_completion(
+                analysis = _completion(
                     prompt,
                     "You are a data scientist analyzing clinical trial operational data."
                 )
@@ -1522,10 +1864,10 @@ Provide actionable insights on which factors to prioritize."""
                     # Build context from all available data
                     context_data = {
                         "total_studies": len(all_metrics),
-                        "total_subjects": sum(m.get("total_subjects", 0) for m in all_metrics.values()),
+                        "total_subjects": portfolio["total_subjects"].sum().item(),
                         "study_names": list(all_metrics.keys()),
-                        "avg_dqi": sum(m.get("avg_dqi", 0) for m in all_metrics.values()) / len(all_metrics) if all_metrics else 0,
-                        "total_queries": sum(m.get("total_open_queries", 0) for m in all_metrics.values())
+                        "avg_dqi": portfolio["avg_dqi"].mean().item(),
+                        "total_queries": portfolio["total_open_queries"].sum().item()
                     }
                     
                     answer = gen_ai.answer_natural_language_query(user_question, context_data)
@@ -1549,6 +1891,82 @@ Provide actionable insights on which factors to prioritize."""
             st.markdown(f"- {example}")
 
 
+def _upload_digest(files):
+    """Digest uploaded file names and contents in one blake2b pass"""
+    from hashlib import blake2b
+    digest = blake2b(digest_size=16)
+    for name, data in files:
+        encoded_name = name.encode("utf-8")
+        # Length prefixes keep name/content boundaries unambiguous
+        for part in (encoded_name, data):
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+    return digest.hexdigest()
+
+
+# Per-subject tallies narrowed from int64 once an upload is processed
+COUNT_COLUMNS = (
+    "missing_visits", "missing_pages", "open_queries", "pending_sdv",
+    "open_safety_issues", "closed_queries", "total_queries"
+)
+
+
+def _downcast_counts(subject_df):
+    """
+    Store integer tally columns as int32 in place
+    
+    Signed 32-bit keeps headroom for sums and differences built from these
+    columns, while halving the bytes every reduction over them reads.
+    """
+    for col in COUNT_COLUMNS:
+        if col in subject_df.columns and pd.api.types.is_integer_dtype(subject_df[col]):
+            subject_df[col] = subject_df[col].astype(np.int32)
+    return subject_df
+
+
+@st.cache_data(ttl=3600)
+def _analyze_upload(files_hash, _files, study_name):
+    """
+    Run the ingestion, harmonization and metrics pipeline on uploaded files
+    
+    Args:
+        files_hash: Content digest of the upload (see _upload_digest); the cache key
+        _files: Tuple of (file name, file bytes) pairs; not hashed by Streamlit
+        study_name: Name given to the uploaded study
+        
+    Returns:
+        Tuple of (study_df, study_metrics, canonical_entities); all None if nothing loaded
+    """
+    from ingestion.multi_file_loader import MultiFileDataLoader
+    
+    # Parse the uploaded bytes directly; no temp-dir write and re-read
+    loader = MultiFileDataLoader(Path("uploads"))
+    study_df = loader.load_from_buffers(study_name, dict(_files))
+    
+    if study_df is None or study_df.empty:
+        return None, None, None
+    
+    # Build canonical model
+    all_data = {study_name: study_df}
+    canonical_model = CanonicalDataModel()
+    canonical_entities = canonical_model.build_canonical_model(all_data)
+    
+    # Calculate metrics
+    metrics_engine = MetricsEngine(canonical_entities, all_data)
+    study_metrics = metrics_engine.calculate_all_metrics_for_study(study_name)
+    
+    # Calculate DQI
+    dqi_calculator = DataQualityIndex()
+    if "subject_metrics" in study_metrics:
+        study_metrics["subject_metrics"] = dqi_calculator.calculate_subject_dqi(
+            study_metrics["subject_metrics"]
+        )
+        _downcast_counts(study_metrics["subject_metrics"])
+    _attach_subject_views(study_metrics)
+    
+    return study_df, study_metrics, canonical_entities
+
+
 def render_upload_analyze():
     """Render upload and analyze page for custom data"""
     st.header("📤 Upload & Analyze Your Data")
@@ -1609,76 +2027,55 @@ def render_upload_analyze():
         st.session_state.uploaded_canonical_entities = None
     if 'uploaded_risk_engine' not in st.session_state:
         st.session_state.uploaded_risk_engine = None
+    if 'uploaded_summary' not in st.session_state:
+        st.session_state.uploaded_summary = None
     
     if uploaded_files and study_name:
         st.success(f"✅ {len(uploaded_files)} file(s) uploaded for {study_name}")
         
         # Show uploaded files
         with st.expander("📄 Uploaded Files"):
-            for i, file in enumerate(uploaded_files, 1):
-                st.write(f"{i}. {file.name} ({file.size / 1024:.1f} KB)")
+            st.markdown("\n".join(
+                f"{i}. {file.name} ({file.size / 1024:.1f} KB)" for i, file in enumerate(uploaded_files, 1)
+            ))
         
         # Analyze button
         if st.button("🔍 Analyze Data", type="primary", key="analyze_uploaded_data"):
             with st.spinner(f"Processing {study_name}..."):
                 try:
-                    # Process uploaded files
-                    from ingestion.multi_file_loader import MultiFileDataLoader
-                    from harmonization import CanonicalDataModel
-                    from metrics import MetricsEngine, DataQualityIndex
-                    from intelligence import RiskIntelligence
-                    import tempfile
-                    import os
+                    # Process uploaded files, cached on a digest of names and contents;
+                    # name order makes re-uploads in any order hit the same entry
+                    files = tuple(sorted(
+                        ((uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files),
+                        key=lambda item: item[0]
+                    ))
+                    study_df, study_metrics, canonical_entities = _analyze_upload(
+                        _upload_digest(files), files, study_name
+                    )
                     
-                    # Create temp directory for uploaded files
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        study_dir = os.path.join(temp_dir, study_name)
-                        os.makedirs(study_dir, exist_ok=True)
+                    if study_df is not None and not study_df.empty:
+                        st.success(f"✅ Successfully loaded {len(study_df)} subjects from {study_name}")
                         
-                        # Save uploaded files to temp directory
-                        for uploaded_file in uploaded_files:
-                            file_path = os.path.join(study_dir, uploaded_file.name)
-                            with open(file_path, "wb") as f:
-                                f.write(uploaded_file.getbuffer())
+                        all_metrics = {study_name: study_metrics}
                         
-                        # Load data using MultiFileDataLoader
-                        loader = MultiFileDataLoader(temp_dir)
-                        study_df = loader.load_study_data(study_name)
+                        # Risk intelligence
+                        risk_engine = RiskIntelligence(all_metrics)
                         
-                        if study_df is not None and not study_df.empty:
-                            st.success(f"✅ Successfully loaded {len(study_df)} subjects from {study_name}")
-                            
-                            # Build canonical model
-                            all_data = {study_name: study_df}
-                            canonical_model = CanonicalDataModel()
-                            canonical_entities = canonical_model.build_canonical_model(all_data)
-                            
-                            # Calculate metrics
-                            metrics_engine = MetricsEngine(canonical_entities, all_data)
-                            study_metrics = metrics_engine.calculate_all_metrics_for_study(study_name)
-                            
-                            # Calculate DQI
-                            dqi_calculator = DataQualityIndex()
-                            if "subject_metrics" in study_metrics:
-                                study_metrics["subject_metrics"] = dqi_calculator.calculate_subject_dqi(
-                                    study_metrics["subject_metrics"]
-                                )
-                            
-                            all_metrics = {study_name: study_metrics}
-                            
-                            # Risk intelligence
-                            risk_engine = RiskIntelligence(all_metrics)
-                            
-                            # Store in session state
-                            st.session_state.uploaded_study_name = study_name
-                            st.session_state.uploaded_study_df = study_df
-                            st.session_state.uploaded_study_metrics = study_metrics
-                            st.session_state.uploaded_all_metrics = all_metrics
-                            st.session_state.uploaded_canonical_entities = canonical_entities
-                            st.session_state.uploaded_risk_engine = risk_engine
-                            
-                        else:
-                            st.error("❌ Failed to load data. Please check your file formats.")
+                        # Store in session state
+                        st.session_state.uploaded_study_name = study_name
+                        st.session_state.uploaded_study_df = study_df
+                        st.session_state.uploaded_study_metrics = study_metrics
+                        st.session_state.uploaded_all_metrics = all_metrics
+                        st.session_state.uploaded_canonical_entities = canonical_entities
+                        st.session_state.uploaded_risk_engine = risk_engine
+                        st.session_state.uploaded_summary = _overview_summary(
+                            study_metrics.get("subject_metrics", pd.DataFrame())
+                        )
+                        for key in UPLOADED_INSIGHTS:
+                            st.session_state[key] = None
+                        
+                    else:
+                        st.error("❌ Failed to load data. Please check your file formats.")
                 
                 except Exception as e:
                     st.error(f"❌ Error processing data: {str(e)}")
@@ -1697,6 +2094,17 @@ def render_upload_analyze():
             # Show comprehensive overview
             render_uploaded_data_overview(study_name, study_metrics, canonical_entities)
             
+            # Every AI narrative for the upload, requested concurrently
+            st.markdown("---")
+            if st.button("🚀 Generate All AI Insights", key="upload_generate_all"):
+                with st.spinner("Generating all insights with Gemini AI..."):
+                    st.session_state.update(_generate_all_insights(study_name, study_metrics, all_metrics))
+            
+            for key, heading in UPLOADED_INSIGHTS.items():
+                if st.session_state.get(key):
+                    with st.expander(heading):
+                        st.markdown(st.session_state[key])
+            
             # Guide users to other views
             st.info("""
             ✨ **Your data has been successfully analyzed and integrated!**
@@ -1737,32 +2145,96 @@ def render_upload_analyze():
             """)
 
 
+@st.cache_data(show_spinner=False)
+def _overview_summary(subject_df):
+    """
+    Compute the headline scalars shown for an uploaded study
+    
+    Args:
+        subject_df: Subject-level metrics DataFrame
+        
+    Returns:
+        Dictionary of totals, averages and risk level counts
+    """
+    totals = ("open_queries", "missing_visits", "missing_pages", "is_clean_patient")
+    
+    # One agg dispatch covers every reduction instead of a scan per column
+    funcs = {col: "sum" for col in totals if col in subject_df.columns}
+    if "dqi_score" in subject_df.columns:
+        funcs["dqi_score"] = "mean"
+    stats = subject_df.agg(funcs) if funcs else pd.Series(dtype=float)
+    
+    def _total(col):
+        return int(stats[col]) if col in stats.index else 0
+    
+    risk_counts = None
+    if "risk_level" in subject_df.columns:
+        risk_counts = subject_df["risk_level"].value_counts()
+    
+    return {
+        "n": len(subject_df),
+        "n_sites": int(subject_df["site_id"].nunique()) if "site_id" in subject_df.columns else 0,
+        "total_queries": _total("open_queries"),
+        "missing_visits": _total("missing_visits"),
+        "missing_pages": _total("missing_pages"),
+        "clean_count": _total("is_clean_patient"),
+        "clean_rate": _total("is_clean_patient") / len(subject_df) * 100 if len(subject_df) > 0 else 0,
+        "avg_dqi": stats["dqi_score"] if "dqi_score" in stats.index else 0,
+        "high_risk": int(risk_counts.get("High", 0)) if risk_counts is not None else 0,
+        "risk_counts": risk_counts,
+    }
+
+
+def _uploaded_summary(subject_df):
+    """Return the scalars stored at upload time, computing them if absent"""
+    summary = st.session_state.get("uploaded_summary")
+    return summary if summary is not None else _overview_summary(subject_df)
+
+
+@st.cache_data(show_spinner=False)
+def _dqi_histogram(scores, bins=20):
+    """
+    Bin DQI scores so the chart ships bin counts instead of every score
+    
+    Args:
+        scores: Float array of subject DQI scores (NaN for unscored subjects)
+        bins: Number of equal-width bins
+        
+    Returns:
+        Tuple of (bin centers, bin counts)
+    """
+    counts, edges = np.histogram(scores[~np.isnan(scores)], bins=bins)
+    return (edges[:-1] + edges[1:]) / 2, counts
+
+
 def render_uploaded_data_overview(study_name, study_metrics, canonical_entities):
     """Render overview of uploaded data analysis"""
     st.subheader(f"📊 Analysis Overview: {study_name}")
     
     if "subject_metrics" in study_metrics:
+        # Deferred to here so an overview with no subject data never loads plotly
+        import plotly.express as px
         subject_df = study_metrics["subject_metrics"]
         site_df = study_metrics.get("site_metrics", pd.DataFrame())
+        summary = _uploaded_summary(subject_df)
+        avg_dqi = summary["avg_dqi"]
+        clean_count = summary["clean_count"]
         
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Subjects", len(subject_df))
+            st.metric("Total Subjects", summary["n"])
         
         with col2:
-            total_sites = len(site_df) if not site_df.empty else len(subject_df["site_id"].unique()) if "site_id" in subject_df.columns else 0
+            total_sites = len(site_df) if not site_df.empty else summary["n_sites"]
             st.metric("Total Sites", total_sites)
         
         with col3:
-            avg_dqi = subject_df["dqi_score"].mean() if "dqi_score" in subject_df.columns else 0
             st.metric("Average DQI", f"{avg_dqi:.1f}")
         
         with col4:
-            clean_count = subject_df["is_clean_patient"].sum() if "is_clean_patient" in subject_df.columns else 0
-            clean_pct = (clean_count / len(subject_df) * 100) if len(subject_df) > 0 else 0
-            st.metric("Clean Data Rate", f"{clean_pct:.1f}%")
+            st.metric("Clean Data Rate", f"{summary['clean_rate']:.1f}%")
         
         st.markdown("---")
         
@@ -1772,16 +2244,12 @@ def render_uploaded_data_overview(study_name, study_metrics, canonical_entities)
         with col1:
             st.write("### 📈 Key Metrics")
             
-            total_queries = int(subject_df["open_queries"].sum()) if "open_queries" in subject_df.columns else 0
-            total_missing_visits = int(subject_df["missing_visits"].sum()) if "missing_visits" in subject_df.columns else 0
-            total_missing_pages = int(subject_df["missing_pages"].sum()) if "missing_pages" in subject_df.columns else 0
-            
             metrics_data = {
                 "Metric": ["Open Queries", "Missing Visits", "Missing Pages", "Clean Subjects"],
                 "Value": [
-                    total_queries,
-                    total_missing_visits,
-                    total_missing_pages,
+                    summary["total_queries"],
+                    summary["missing_visits"],
+                    summary["missing_pages"],
                     clean_count
                 ]
             }
@@ -1791,8 +2259,8 @@ def render_uploaded_data_overview(study_name, study_metrics, canonical_entities)
         with col2:
             st.write("### ⚠️ Risk Distribution")
             
-            if "risk_level" in subject_df.columns:
-                risk_counts = subject_df["risk_level"].value_counts()
+            if summary["risk_counts"] is not None:
+                risk_counts = summary["risk_counts"]
                 
                 fig = px.pie(
                     values=risk_counts.values,
@@ -1808,14 +2276,15 @@ def render_uploaded_data_overview(study_name, study_metrics, canonical_entities)
         st.write("### 📊 Data Quality Distribution")
         
         if "dqi_score" in subject_df.columns:
-            fig = px.histogram(
-                subject_df,
-                x="dqi_score",
-                nbins=20,
+            centers, counts = _dqi_histogram(subject_df["dqi_score"].to_numpy(dtype=float))
+            fig = px.bar(
+                x=centers,
+                y=counts,
                 title="DQI Score Distribution",
-                labels={"dqi_score": "DQI Score"},
+                labels={"x": "DQI Score", "y": "count"},
                 color_discrete_sequence=["#1f77b4"]
             )
+            fig.update_layout(bargap=0)
             fig.add_vline(x=avg_dqi, line_dash="dash", line_color="red", annotation_text=f"Mean: {avg_dqi:.1f}")
             st.plotly_chart(fig, width='stretch')
         
@@ -1825,33 +2294,119 @@ def render_uploaded_data_overview(study_name, study_metrics, canonical_entities)
         
         col1, col2 = st.columns(2)
         
+        today = pd.Timestamp.now().strftime('%Y%m%d')
+        
         with col1:
             if st.button("Export Subject Metrics"):
-                csv = subject_df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name=f"{study_name}_subject_metrics_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
-                )
+                _metrics_downloads(subject_df, f"{study_name}_subject_metrics_{today}")
         
         with col2:
             if not site_df.empty and st.button("Export Site Metrics"):
-                csv = site_df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name=f"{study_name}_site_metrics_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
-                )
+                _metrics_downloads(site_df, f"{study_name}_site_metrics_{today}")
+
+
+# Uploaded-study AI narratives: session_state key -> heading shown with it
+UPLOADED_INSIGHTS = {
+    "uploaded_exec_summary": "Study Overview",
+    "uploaded_study_analysis": "Study Analysis",
+    "uploaded_action_plan": "Prioritized Action Plan",
+    "uploaded_recommendations": "Detailed Recommendations"
+}
+
+CONSULTANT_ROLE = "You are a clinical trial quality improvement consultant."
+
+
+def _action_plan_prompt(study_name, high_risk):
+    """Build the action plan prompt from the ten leading high-risk subjects"""
+    top = high_risk.head(10)
+    
+    def _field(col, default):
+        return top[col] if col in top.columns else pd.Series(default, index=top.index)
+    
+    # Assemble all prompt lines column-wise rather than row by row
+    lines = (
+        "- Subject " + _field("subject_id", "N/A").astype(str)
+        + ", Site " + _field("site_id", "N/A").astype(str)
+        + ": DQI=" + _field("dqi_score", 0).map("{:.1f}".format)
+        + ", Issues=" + _field("open_queries", 0).astype(str)
+        + "\n"
+    )
+    context = f"High-Risk Items in {study_name}:\n" + "".join(lines)
+    
+    return f"""{context}
+
+Generate a prioritized action plan:
+1. Immediate actions (next 24-48 hours)
+2. Short-term actions (this week)
+3. Medium-term improvements (this month)
+
+For each action, specify:
+- What to do
+- Why it matters
+- Who should do it
+- Expected impact"""
+
 
+def _recommendations_prompt(overview):
+    """Build the improvement recommendations prompt from a study summary"""
+    return f"""Based on this study's performance:
+- Total Subjects: {overview['n']}
+- Clean Rate: {overview['clean_rate']:.1f}%
+- Open Queries: {overview['total_queries']}
+- Avg DQI: {overview['avg_dqi']:.1f}
 
+Provide:
+1. 3 specific improvement actions
+2. Expected impact of each action
+3. Implementation difficulty (Low/Medium/High)
+4. Estimated timeline for each
+
+Be specific and actionable."""
+
+
+def _generate_all_insights(study_name, study_metrics, all_metrics):
+    """
+    Request every uploaded-study AI narrative at once
+    
+    Args:
+        study_name: Name of the uploaded study
+        study_metrics: Metrics dictionary for the uploaded study
+        all_metrics: Metrics for every loaded study, used by the overview narrative
+        
+    Returns:
+        Dictionary mapping UPLOADED_INSIGHTS keys to generated text
+    """
+    gen_ai = _gen_ai()
+    subject_df = study_metrics.get("subject_metrics", pd.DataFrame())
+    
+    tasks = {
+        "uploaded_exec_summary": lambda: gen_ai.generate_executive_dashboard_narrative(all_metrics),
+        "uploaded_study_analysis": lambda: gen_ai.summarize_study_performance(study_name, study_metrics)
+    }
+    if not subject_df.empty:
+        recs_prompt = _recommendations_prompt(_uploaded_summary(subject_df))
+        tasks["uploaded_recommendations"] = lambda: _completion(recs_prompt, CONSULTANT_ROLE)
+        if "risk_level" in subject_df.columns:
+            high_risk = _subject_view(subject_df, study_metrics.get("_views"), "high_risk_mask")
+            if not high_risk.empty:
+                plan_prompt = _action_plan_prompt(study_name, high_risk)
+                tasks["uploaded_action_plan"] = lambda: _completion(plan_prompt, CONSULTANT_ROLE)
+    
+    # Gemini calls wait on HTTP, so the requests overlap instead of queueing.
+    # Workers share this run's context so the cached _completion can run in them
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=len(tasks), initializer=lambda: add_script_run_ctx(ctx=ctx)) as executor:
+        futures = {key: executor.submit(task) for key, task in tasks.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+@st.fragment
 def render_uploaded_executive_summary(study_name, all_metrics):
     """Render AI-powered executive summary for uploaded data"""
     st.subheader("📋 Executive Summary")
     st.markdown("*AI-generated insights powered by Google Gemini*")
     
-    gen_ai = GenerativeAI()
+    gen_ai = _gen_ai()
     
     # Initialize session state for this summary
     if 'uploaded_exec_summary' not in st.session_state:
@@ -1875,36 +2430,32 @@ def render_uploaded_executive_summary(study_name, all_metrics):
     subject_df = study_metrics.get("subject_metrics", pd.DataFrame())
     
     if not subject_df.empty:
+        summary = _uploaded_summary(subject_df)
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Subjects", len(subject_df))
+            st.metric("Total Subjects", summary["n"])
         
         with col2:
-            clean_count = subject_df["is_clean_patient"].sum() if "is_clean_patient" in subject_df.columns else 0
-            clean_pct = (clean_count / len(subject_df) * 100) if len(subject_df) > 0 else 0
-            st.metric("Clean Data Rate", f"{clean_pct:.1f}%")
+            st.metric("Clean Data Rate", f"{summary['clean_rate']:.1f}%")
         
         with col3:
-            avg_dqi = subject_df["dqi_score"].mean() if "dqi_score" in subject_df.columns else 0
-            st.metric("Average DQI", f"{avg_dqi:.1f}")
+            st.metric("Average DQI", f"{summary['avg_dqi']:.1f}")
         
         with col4:
-            high_risk = (subject_df["risk_level"] == "High").sum() if "risk_level" in subject_df.columns else 0
-            st.metric("High Risk Subjects", high_risk)
+            st.metric("High Risk Subjects", summary["high_risk"])
 
 
-def render_uploaded_critical_actions(study_name, all_metrics):
+@st.fragment
+def render_uploaded_critical_actions(study_name, study_metrics):
     """Render critical actions for uploaded data"""
     st.subheader("⚠️ Critical Actions Required")
     st.markdown("*AI-prioritized action items*")
     
-    gen_ai = GenerativeAI()
-    study_metrics = all_metrics.get(study_name, {})
     subject_df = study_metrics.get("subject_metrics", pd.DataFrame())
     
     if not subject_df.empty and "risk_level" in subject_df.columns:
-        high_risk = subject_df[subject_df["risk_level"] == "High"]
+        high_risk = _subject_view(subject_df, study_metrics.get("_views"), "high_risk_mask")
         
         if not high_risk.empty:
             st.warning(f"🚨 Found {len(high_risk)} high-risk items requiring immediate attention")
@@ -1912,101 +2463,71 @@ def render_uploaded_critical_actions(study_name, all_metrics):
             # Show top high-risk subjects
             st.write("### Top High-Risk Subjects")
             display_cols = ["subject_id", "site_id", "dqi_score", "open_queries", "missing_visits", "missing_pages"]
-            available_cols = [col for col in display_cols if col in high_risk.columns]
+            available_cols = _present_columns(high_risk, display_cols)
             st.dataframe(high_risk[available_cols].head(10), width='stretch')
             
             if st.button("Generate Action Plan", key="upload_action_plan"):
                 with st.spinner("Generating prioritized action plan with Gemini AI..."):
-                    context = f"High-Risk Items in {study_name}:\n"
-                    for _, row in high_risk.head(10).iterrows():
-                        context += f"- Subject {row.get('subject_id', 'N/A')}, Site {row.get('site_id', 'N/A')}: DQI={row.get('dqi_score', 0):.1f}, Issues={row.get('open_queries', 0)}\n"
-                    
-                    prompt = f"""{context}
-
-Generate a prioritized action plan:
-1. Immediate actions (next 24-48 hours)
-2. Short-term actions (this week)
-3. Medium-term improvements (this month)
-
-For each action, specify:
-- What to do
-- Why it matters
-- Who should do it
-- Expected impact"""
-                    
-                    action_plan = gen_ai._generate_completion(
-                        prompt,
-                        "You are a clinical trial quality improvement consultant."
+                    st.session_state.uploaded_action_plan = _completion(
+                        _action_plan_prompt(study_name, high_risk),
+                        CONSULTANT_ROLE
                     )
-                    st.markdown(f"### Prioritized Action Plan\n\n{action_plan}")
+            
+            if st.session_state.get("uploaded_action_plan"):
+                st.markdown(f"### Prioritized Action Plan\n\n{st.session_state.uploaded_action_plan}")
         else:
             st.success("✅ No critical high-risk items found. Your study is performing well!")
     else:
         st.info("Risk assessment data not available")
 
 
+@st.fragment
 def render_uploaded_study_insights(study_name, study_metrics):
     """Render AI study insights for uploaded data"""
     st.subheader("📊 Study-Level Insights")
     
-    gen_ai = GenerativeAI()
+    gen_ai = _gen_ai()
     subject_df = study_metrics.get("subject_metrics", pd.DataFrame())
     
     if not subject_df.empty:
+        overview = _uploaded_summary(subject_df)
+        clean_rate = overview["clean_rate"]
         col1, col2 = st.columns([2, 1])
         
         with col1:
             if st.button("Generate Study Analysis", key="upload_study_analysis"):
                 with st.spinner("Analyzing study with Gemini AI..."):
-                    summary = gen_ai.summarize_study_performance(study_name, study_metrics)
-                    st.success("✅ Analysis Complete")
-                    st.markdown(f"### Study Analysis\n\n{summary}")
-                    
-                    st.markdown("---")
-                    if st.button("Get Detailed Recommendations", key="upload_detailed_recs"):
-                        with st.spinner("Generating detailed recommendations..."):
-                            total_subj = len(subject_df)
-                            clean_rt = (subject_df["is_clean_patient"].sum() / len(subject_df) * 100) if "is_clean_patient" in subject_df.columns else 0
-                            avg_dqi_val = subject_df["dqi_score"].mean() if "dqi_score" in subject_df.columns else 0
-                            open_q = subject_df["open_queries"].sum() if "open_queries" in subject_df.columns else 0
-                            
-                            prompt = f"""Based on this study's performance:
-- Total Subjects: {total_subj}
-- Clean Rate: {clean_rt:.1f}%
-- Open Queries: {open_q}
-- Avg DQI: {avg_dqi_val:.1f}
-
-Provide:
-1. 3 specific improvement actions
-2. Expected impact of each action
-3. Implementation difficulty (Low/Medium/High)
-4. Estimated timeline for each
-
-Be specific and actionable."""
-                            
-                            recommendations = gen_ai._generate_completion(
-                                prompt,
-                                "You are a clinical trial quality improvement consultant."
-                            )
-                            st.markdown(f"### Detailed Recommendations\n\n{recommendations}")
+                    st.session_state.uploaded_study_analysis = gen_ai.summarize_study_performance(study_name, study_metrics)
+            
+            if st.session_state.get("uploaded_study_analysis"):
+                st.success("✅ Analysis Complete")
+                st.markdown(f"### Study Analysis\n\n{st.session_state.uploaded_study_analysis}")
+                
+                st.markdown("---")
+                if st.button("Get Detailed Recommendations", key="upload_detailed_recs"):
+                    with st.spinner("Generating detailed recommendations..."):
+                        st.session_state.uploaded_recommendations = _completion(
+                            _recommendations_prompt(overview),
+                            CONSULTANT_ROLE
+                        )
+                
+                if st.session_state.get("uploaded_recommendations"):
+                    st.markdown(f"### Detailed Recommendations\n\n{st.session_state.uploaded_recommendations}")
         
         with col2:
-            st.metric("Total Subjects", len(subject_df))
-            clean_rate = (subject_df["is_clean_patient"].sum() / len(subject_df) * 100) if "is_clean_patient" in subject_df.columns else 0
+            st.metric("Total Subjects", overview["n"])
             st.metric("Clean Rate", f"{clean_rate:.1f}%")
-            avg_dqi = subject_df["dqi_score"].mean() if "dqi_score" in subject_df.columns else 0
-            st.metric("Avg DQI", f"{avg_dqi:.1f}")
+            st.metric("Avg DQI", f"{overview['avg_dqi']:.1f}")
     else:
         st.info("No subject data available for analysis")
 
 
-def render_uploaded_deep_dive(study_name, all_metrics):
+@st.fragment
+def render_uploaded_deep_dive(study_name, study_metrics):
     """Render deep dive analysis for uploaded data"""
     st.subheader("🔍 Deep Dive Analysis")
     st.markdown("*Advanced AI-powered analysis of specific issues*")
     
-    gen_ai = GenerativeAI()
-    study_metrics = all_metrics.get(study_name, {})
     subject_df = study_metrics.get("subject_metrics", pd.DataFrame())
     
     analysis_type = st.selectbox(
@@ -2017,9 +2538,9 @@ def render_uploaded_deep_dive(study_name, all_metrics):
     if st.button("Run Deep Dive Analysis", key="upload_deep_dive"):
         with st.spinner(f"Running {analysis_type} with Gemini AI..."):
             if not subject_df.empty:
+                summary = _uploaded_summary(subject_df)
                 if analysis_type == "Query Hotspot Analysis":
-                    total_queries = subject_df["open_queries"].sum() if "open_queries" in subject_df.columns else 0
-                    context = f"Total open queries in {study_name}: {total_queries}\n"
+                    context = f"Total open queries in {study_name}: {summary['total_queries']}\n"
                     
                     prompt = f"""{context}\nAnalyze query patterns and identify:
 1. Root causes of high query volumes
@@ -2028,8 +2549,7 @@ def render_uploaded_deep_dive(study_name, all_metrics):
 4. Expected timeline for improvements"""
                 
                 elif analysis_type == "Site Performance Patterns":
-                    sites = subject_df["site_id"].nunique() if "site_id" in subject_df.columns else 0
-                    context = f"Study {study_name} has {sites} sites\n"
+                    context = f"Study {study_name} has {summary['n_sites']} sites\n"
                     
                     prompt = f"""{context}\nAnalyze site performance patterns:
 1. Identify top and bottom performing sites
@@ -2038,9 +2558,7 @@ def render_uploaded_deep_dive(study_name, all_metrics):
 4. Best practices to replicate across sites"""
                 
                 elif analysis_type == "Data Completeness Trends":
-                    missing_v = subject_df["missing_visits"].sum() if "missing_visits" in subject_df.columns else 0
-                    missing_p = subject_df["missing_pages"].sum() if "missing_pages" in subject_df.columns else 0
-                    context = f"Missing visits: {missing_v}, Missing pages: {missing_p}\n"
+                    context = f"Missing visits: {summary['missing_visits']}, Missing pages: {summary['missing_pages']}\n"
                     
                     prompt = f"""{context}\nAnalyze data completeness:
 1. Primary drivers of missing data
@@ -2049,8 +2567,7 @@ def render_uploaded_deep_dive(study_name, all_metrics):
 4. Monitoring strategy going forward"""
                 
                 else:  # Risk Factor Correlation
-                    high_risk = (subject_df["risk_level"] == "High").sum() if "risk_level" in subject_df.columns else 0
-                    context = f"High risk subjects: {high_risk}\n"
+                    context = f"High risk subjects: {summary['high_risk']}\n"
                     
                     prompt = f"""{context}\nAnalyze risk factors:
 1. What factors correlate with high risk?
@@ -2058,7 +2575,7 @@ def render_uploaded_deep_dive(study_name, all_metrics):
 3. Predictive indicators for future risk
 4. Preventive measures to implement"""
                 
-                analysis = gen_ai._generate_completion(
+                analysis = _completion(
                     prompt,
                     "You are a clinical trial data analytics expert."
                 )
@@ -2067,12 +2584,13 @@ def render_uploaded_deep_dive(study_name, all_metrics):
                 st.warning("Insufficient data for deep dive analysis")
 
 
-def render_uploaded_ask_ai(study_name, study_metrics, study_df):
+@st.fragment
+def render_uploaded_ask_ai(study_name, study_metrics):
     """Render Ask AI chatbot for uploaded data"""
     st.subheader("💬 Ask AI About Your Study")
     st.markdown("*Ask any question about your uploaded data*")
     
-    gen_ai = GenerativeAI()
+    gen_ai = _gen_ai()
     subject_df = study_metrics.get("subject_metrics", pd.DataFrame())
     
     # Provide some context about available data
@@ -2088,33 +2606,37 @@ def render_uploaded_ask_ai(study_name, study_metrics, study_df):
         - Are there any concerning trends in the data?
         """)
     
-    # Chat interface
-    user_question = st.text_area(
-        "Your Question:",
-        placeholder="e.g., What are the top 3 actions I should take to improve data quality?",
-        height=100
-    )
+    # Chat interface; the form holds edits back until Ask AI is pressed, so
+    # typing a question does not rerun the page
+    with st.form("upload_ask_ai_form", border=False):
+        user_question = st.text_area(
+            "Your Question:",
+            placeholder="e.g., What are the top 3 actions I should take to improve data quality?",
+            height=100
+        )
+        submitted = st.form_submit_button("Ask AI", key="upload_ask_ai", type="primary")
     
-    if st.button("Ask AI", key="upload_ask_ai", type="primary"):
+    if submitted:
         if user_question:
             with st.spinner("Thinking..."):
-                # Build context about the study
+                # Build context about the study from the upload-time summary
+                summary = _uploaded_summary(subject_df)
+                n = summary["n"]
                 context = {
                     "study_name": study_name,
-                    "total_subjects": len(subject_df)
+                    "total_subjects": n
                 }
                 
-                if not subject_df.empty:
-                    if "dqi_score" in subject_df.columns:
-                        context["average_dqi"] = round(subject_df['dqi_score'].mean(), 1)
-                    if "is_clean_patient" in subject_df.columns:
-                        clean_pct = (subject_df["is_clean_patient"].sum() / len(subject_df) * 100)
-                        context["clean_data_rate_pct"] = round(clean_pct, 1)
-                    if "open_queries" in subject_df.columns:
-                        context["total_open_queries"] = int(subject_df['open_queries'].sum())
-                    if "risk_level" in subject_df.columns:
-                        high_risk = (subject_df["risk_level"] == "High").sum()
-                        context["high_risk_subjects"] = int(high_risk)
+                if n:
+                    columns = subject_df.columns
+                    if "dqi_score" in columns:
+                        context["average_dqi"] = round(summary["avg_dqi"], 1)
+                    if "is_clean_patient" in columns:
+                        context["clean_data_rate_pct"] = round(summary["clean_rate"], 1)
+                    if "open_queries" in columns:
+                        context["total_open_queries"] = summary["total_queries"]
+                    if "risk_level" in columns:
+                        context["high_risk_subjects"] = summary["high_risk"]
                 
                 answer = gen_ai.answer_natural_language_query(user_question, context)
                 st.success("✅ Answer:")
@@ -2174,24 +2696,30 @@ def main():
         all_data[st.session_state.uploaded_study_name] = st.session_state.uploaded_study_df
         all_metrics[st.session_state.uploaded_study_name] = st.session_state.uploaded_study_metrics
         
-        # Rebuild risk engine with uploaded data
+        # Rebuild risk engine with uploaded data, once per upload; the
+        # bundled studies' metrics are fixed, so the uploaded metrics object
+        # identifies the combined portfolio
         if all_metrics:
-            risk_engine = RiskIntelligence(all_metrics)
+            uploaded_metrics = st.session_state.uploaded_study_metrics
+            if st.session_state.get("combined_risk_engine_source") is not uploaded_metrics:
+                st.session_state.combined_risk_engine = RiskIntelligence(all_metrics)
+                st.session_state.combined_risk_engine_source = uploaded_metrics
+            risk_engine = st.session_state.combined_risk_engine
     
     # Sidebar navigation
     page, uploaded_tab = render_sidebar()
     
     # Render selected page
-    if page == "📊 Executive Dashboard":
-        render_executive_dashboard(all_metrics, risk_engine)
-    elif page == "🔍 Study Analysis":
-        render_study_view(all_metrics, risk_engine)
-    elif page == "📈 CRA Dashboard":
-        render_cra_dashboard(all_data, all_metrics, canonical_entities, risk_engine)
-    elif page == "🤖 AI Insights":
-        render_ai_insights_page(all_data, all_metrics, risk_engine)
-    elif page == "📤 Upload & Analyze":
-        render_upload_analyze()
+    pages = {
+        "📊 Executive Dashboard": lambda: render_executive_dashboard(all_metrics, risk_engine),
+        "🔍 Study Analysis": lambda: render_study_view(all_metrics, risk_engine),
+        "📈 CRA Dashboard": lambda: render_cra_dashboard(all_data, all_metrics, canonical_entities, risk_engine),
+        "🤖 AI Insights": lambda: render_ai_insights_page(all_data, all_metrics, risk_engine),
+        "📤 Upload & Analyze": render_upload_analyze
+    }
+    render_page = pages.get(page)
+    if render_page is not None:
+        render_page()
 
 
 if __name__ == "__main__":
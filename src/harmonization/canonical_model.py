@@ -4,13 +4,30 @@ Creates a unified canonical data model from heterogeneous sources
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
-from pathlib import Path
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
 
-from config import COLUMN_MAPPINGS
+# Import from config module (top-level when src/ is on sys.path, relative under the src package)
+try:
+    from ..config import COLUMN_MAPPINGS
+except ImportError:
+    from config import COLUMN_MAPPINGS
+
+# COLUMN_MAPPINGS with variations lowercased once at import, in mapping order
+_COLUMN_MAPPING_INDEX = [
+    (standard_name, tuple(variation.lower() for variation in variations))
+    for standard_name, variations in COLUMN_MAPPINGS.items()
+]
+
+# Standard name -> standard names whose variations it matches, so columns that
+# are already standardized skip the variation scan with identical results
+_STANDARD_NAME_MATCHES = {
+    name: frozenset(
+        standard_name for standard_name, variations in _COLUMN_MAPPING_INDEX
+        if any(variation in name or name in variation for variation in variations)
+    )
+    for name in COLUMN_MAPPINGS
+}
 
 
 class CanonicalDataModel:
@@ -30,6 +47,12 @@ class CanonicalDataModel:
             "lab_data": pd.DataFrame(),
             "coding_data": pd.DataFrame()
         }
+        # (entity_type, column names in order) -> rename dict; the mapping
+        # outcome depends on column order, so the key keeps it
+        self._rename_cache: Dict[Tuple[str, tuple], Dict[str, str]] = {}
+        # entity name -> (entity frame, frame indexed by (study_id, subject_id));
+        # rebuilt whenever the entity frame is replaced
+        self._patient_index: Dict[str, tuple] = {}
         logger.info("Canonical Data Model initialized")
     
     def standardize_column_names(self, df: pd.DataFrame, entity_type: str) -> pd.DataFrame:
@@ -46,24 +69,33 @@ class CanonicalDataModel:
         if df is None or df.empty:
             return df
         
-        df_copy = df.copy()
-        renamed_cols = {}
-        
-        for standard_name, variations in COLUMN_MAPPINGS.items():
-            for col in df_copy.columns:
-                col_stripped = str(col).strip()
-                # Check for exact matches or partial matches
-                for variation in variations:
-                    if variation.lower() in col_stripped.lower() or col_stripped.lower() in variation.lower():
-                        if col not in renamed_cols:  # Avoid renaming same column twice
-                            renamed_cols[col] = standard_name
-                            logger.debug(f"Renamed '{col}' to '{standard_name}' in {entity_type}")
+        rename_key = (entity_type, tuple(df.columns))
+        renamed_cols = self._rename_cache.get(rename_key)
+        if renamed_cols is None:
+            renamed_cols = {}
+            
+            # Lowercase each column name once rather than once per variation
+            columns_lower = [
+                (col, col_lower, _STANDARD_NAME_MATCHES.get(col_lower))
+                for col, col_lower in ((col, str(col).strip().lower()) for col in df.columns)
+            ]
+            
+            for standard_name, variations in _COLUMN_MAPPING_INDEX:
+                for col, col_lower, known_matches in columns_lower:
+                    # Check for exact matches or partial matches
+                    if col not in renamed_cols and (
+                        standard_name in known_matches if known_matches is not None
+                        else any(variation in col_lower or col_lower in variation for variation in variations)
+                    ):
+                        renamed_cols[col] = standard_name
+                        logger.debug(f"Renamed '{col}' to '{standard_name}' in {entity_type}")
+                    if col in renamed_cols:
                         break
-                if col in renamed_cols:
-                    break
+            
+            self._rename_cache[rename_key] = renamed_cols
         
-        df_copy.rename(columns=renamed_cols, inplace=True)
-        return df_copy
+        # New frame over the same column data; callers only add columns or select
+        return df.rename(columns=renamed_cols, copy=False)
     
     def extract_study_entity(self, all_data: Dict[str, Dict[str, pd.DataFrame]]) -> pd.DataFrame:
         """
@@ -212,8 +244,8 @@ class CanonicalDataModel:
         for study_name, study_data in all_data.items():
             if "sae_dashboard" in study_data:
                 sae_df = self.standardize_column_names(study_data["sae_dashboard"], "sae_dashboard")
-                sae_df["study_id"] = study_name
-                safety_events.append(sae_df)
+                # assign() leaves the standardized frame, which shares the source data, untouched
+                safety_events.append(sae_df.assign(study_id=study_name))
         
         if safety_events:
             self.entities["safety_events"] = pd.concat(safety_events, ignore_index=True)
@@ -233,7 +265,8 @@ class CanonicalDataModel:
         """
         logger.info("Building canonical data model from consolidated data...")
         
-        # Data is already consolidated at subject level, just extract entities
+        # Data is already consolidated at subject level, just extract entities;
+        # slices are deduplicated once after a single concat per entity
         subjects = []
         sites = []
         studies = []
@@ -242,27 +275,13 @@ class CanonicalDataModel:
             if study_df is not None and not study_df.empty:
                 # Extract subjects
                 if "subject_id" in study_df.columns:
-                    subject_cols = ["subject_id", "site_id"]
-                    if "country" in study_df.columns:
-                        subject_cols.append("country")
-                    
-                    existing_cols = [col for col in subject_cols if col in study_df.columns]
-                    if existing_cols:
-                        subject_df = study_df[existing_cols].drop_duplicates()
-                        subject_df["study_id"] = study_name
-                        subjects.append(subject_df)
+                    subject_cols = [col for col in ("subject_id", "site_id", "country") if col in study_df.columns]
+                    subjects.append(study_df[subject_cols].assign(study_id=study_name))
                 
                 # Extract sites
                 if "site_id" in study_df.columns:
-                    site_cols = ["site_id"]
-                    if "country" in study_df.columns:
-                        site_cols.append("country")
-                    
-                    existing_cols = [col for col in site_cols if col in study_df.columns]
-                    if existing_cols:
-                        site_df = study_df[existing_cols].drop_duplicates()
-                        site_df["study_id"] = study_name
-                        sites.append(site_df)
+                    site_cols = [col for col in ("site_id", "country") if col in study_df.columns]
+                    sites.append(study_df[site_cols].assign(study_id=study_name))
                 
                 # Study entity
                 studies.append({
@@ -270,15 +289,15 @@ class CanonicalDataModel:
                     "subject_count": len(study_df)
                 })
         
-        # Consolidate entities
+        # Consolidate entities; study_id keeps duplicates from crossing studies
         if subjects:
-            self.entities["subjects"] = pd.concat(subjects, ignore_index=True)
+            self.entities["subjects"] = pd.concat(subjects, ignore_index=True).drop_duplicates(ignore_index=True)
             logger.info(f"Extracted {len(self.entities['subjects'])} subject entities")
         else:
             self.entities["subjects"] = pd.DataFrame()
         
         if sites:
-            self.entities["sites"] = pd.concat(sites, ignore_index=True)
+            self.entities["sites"] = pd.concat(sites, ignore_index=True).drop_duplicates(ignore_index=True)
             logger.info(f"Extracted {len(self.entities['sites'])} site entities")
         else:
             self.entities["sites"] = pd.DataFrame()
@@ -305,6 +324,30 @@ class CanonicalDataModel:
         """
         return self.entities.get(entity_name)
     
+    def _patient_rows(self, entity_name: str, study_id: str, subject_id: str) -> pd.DataFrame:
+        """
+        Look up an entity's rows for one patient through a (study_id, subject_id) index
+        
+        Args:
+            entity_name: Name of an entity with study_id and subject_id columns
+            study_id: Study identifier
+            subject_id: Subject identifier
+            
+        Returns:
+            Matching rows in their original order, or an empty DataFrame
+        """
+        entity = self.entities[entity_name]
+        cached = self._patient_index.get(entity_name)
+        if cached is None or cached[0] is not entity:
+            # drop=False keeps the key columns in each returned record
+            cached = (entity, entity.set_index(["study_id", "subject_id"], drop=False))
+            self._patient_index[entity_name] = cached
+        
+        try:
+            return cached[1].loc[[(study_id, subject_id)]]
+        except KeyError:
+            return entity.iloc[0:0]
+    
     def get_unified_patient_view(self, study_id: str, subject_id: str) -> Dict:
         """
         Get a complete unified view of a single patient
@@ -324,29 +367,20 @@ class CanonicalDataModel:
         # Get subject info
         subjects = self.entities["subjects"]
         if not subjects.empty:
-            subject_data = subjects[
-                (subjects["study_id"] == study_id) & 
-                (subjects["subject_id"] == subject_id)
-            ]
+            subject_data = self._patient_rows("subjects", study_id, subject_id)
             if not subject_data.empty:
                 patient_view.update(subject_data.iloc[0].to_dict())
         
         # Get visits
         visits = self.entities["visits"]
         if not visits.empty:
-            visit_data = visits[
-                (visits["study_id"] == study_id) & 
-                (visits["subject_id"] == subject_id)
-            ]
+            visit_data = self._patient_rows("visits", study_id, subject_id)
             patient_view["visits"] = visit_data.to_dict("records")
         
         # Get safety events
         safety = self.entities["safety_events"]
         if not safety.empty and "subject_id" in safety.columns:
-            safety_data = safety[
-                (safety["study_id"] == study_id) & 
-                (safety["subject_id"] == subject_id)
-            ]
+            safety_data = self._patient_rows("safety_events", study_id, subject_id)
             patient_view["safety_events"] = safety_data.to_dict("records")
         
         return patient_view
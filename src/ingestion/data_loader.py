@@ -4,19 +4,45 @@ Handles loading and validation of clinical trial data files
 """
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import re
+import threading
 from loguru import logger
 
-# Import from config module
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
-from config import DATA_PATH, FILE_TYPE_PATTERNS
+# Import from config module (top-level when src/ is on sys.path, relative under the src package)
+try:
+    from ..config import DATA_PATH, EXCEL_CACHE_PATH, FILE_TYPE_PATTERNS
+except ImportError:
+    from config import DATA_PATH, EXCEL_CACHE_PATH, FILE_TYPE_PATTERNS
 
 # Import new multi-file loader
-from .multi_file_loader import MultiFileDataLoader
+from .multi_file_loader import MultiFileDataLoader, EXCEL_ENGINE
+
+# Column-name fragments that mark numeric count columns in EDC metrics files
+_NUMERIC_COL_RE = re.compile(r'Missing|#|Open|Closed|Total|Count')
+
+# File classification rules: lowercased file-name pattern -> file type, first match wins
+_FILE_TYPE_RULES = [
+    (re.compile(r'edc_metrics|cpid'), 'edc_metrics'),
+    (re.compile(r'missing[_ ]pages'), 'missing_pages'),
+    (re.compile(r'^(?=.*sae)(?=.*dashboard)'), 'sae_dashboard'),
+    (re.compile(r'^(?=.*coding)(?=.*meddra)'), 'coding_meddra'),
+    (re.compile(r'^(?=.*coding)(?=.*who)'), 'coding_whodd'),
+    (re.compile(r'coding'), 'coding_report'),
+    (re.compile(r'^(?=.*lab)(?=.*(?:missing|range))'), 'lab_report'),
+    (re.compile(r'^(?=.*visit)(?=.*projection)'), 'visit_projection'),
+    (re.compile(r'inactivated'), 'inactivated_forms'),
+    (re.compile(r'edrr'), 'edrr'),
+]
+
+
+def _strip_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip surrounding whitespace from column names, renaming only those that change"""
+    renamed = {c: c.strip() for c in df.columns if isinstance(c, str) and c != c.strip()}
+    return df.rename(columns=renamed, copy=False) if renamed else df
 
 
 class DataIngestionEngine:
@@ -33,12 +59,14 @@ class DataIngestionEngine:
             data_directory: Path to the directory containing data files
         """
         self.data_directory = data_directory or DATA_PATH
-        self.multi_file_loader = MultiFileDataLoader(self.data_directory)
+        self.multi_file_loader = MultiFileDataLoader(self.data_directory, cache_directory=EXCEL_CACHE_PATH)
         self.ingestion_metadata = {
             "timestamp": datetime.now(),
             "files_processed": [],
             "errors": []
         }
+        # Guards ingestion_metadata while files are loaded on worker threads
+        self._metadata_lock = threading.Lock()
         logger.info(f"Data Ingestion Engine initialized with directory: {self.data_directory}")
     
     def discover_studies(self) -> List[str]:
@@ -67,7 +95,8 @@ class DataIngestionEngine:
         
         if df is not None and not df.empty:
             logger.info(f"Successfully loaded {study_name}: {len(df)} subjects")
-            self.ingestion_metadata["files_processed"].append(study_name)
+            with self._metadata_lock:
+                self.ingestion_metadata["files_processed"].append(study_name)
             return df
         else:
             logger.warning(f"No data loaded for {study_name}")
@@ -97,13 +126,14 @@ class DataIngestionEngine:
             else:
                 # Standard load for other file types
                 if file_path.suffix.lower() == '.xlsx':
-                    df = pd.read_excel(file_path, engine='openpyxl')
+                    df = pd.read_excel(file_path, engine=EXCEL_ENGINE, dtype_backend='pyarrow')
                 else:
-                    df = pd.read_excel(file_path, engine='xlrd')
+                    df = pd.read_excel(file_path, engine='xlrd', dtype_backend='pyarrow')
             
             if df is not None and not df.empty:
                 logger.info(f"Successfully loaded: {file_path.name} ({len(df)} rows)")
-                self.ingestion_metadata["files_processed"].append(str(file_path))
+                with self._metadata_lock:
+                    self.ingestion_metadata["files_processed"].append(str(file_path))
                 return df
             else:
                 logger.warning(f"Empty dataframe from {file_path.name}")
@@ -112,7 +142,8 @@ class DataIngestionEngine:
         except Exception as e:
             error_msg = f"Error loading {file_path.name}: {str(e)}"
             logger.error(error_msg)
-            self.ingestion_metadata["errors"].append(error_msg)
+            with self._metadata_lock:
+                self.ingestion_metadata["errors"].append(error_msg)
             return None
     
     def _load_edc_metrics_file(self, file_path: Path) -> pd.DataFrame:
@@ -122,51 +153,36 @@ class DataIngestionEngine:
         """
         try:
             # Read raw data to understand structure
-            raw_df = pd.read_excel(file_path, header=None, engine='openpyxl')
+            raw_df = pd.read_excel(file_path, header=None, engine=EXCEL_ENGINE)
             
             if raw_df.empty or len(raw_df) < 4:
                 return pd.DataFrame()
             
-            # Extract header rows
-            header_row1 = raw_df.iloc[0].fillna('')
-            header_row2 = raw_df.iloc[1].fillna('')
-            header_row3 = raw_df.iloc[2].fillna('')
+            # Extract the three header rows, blanking out empty and 'nan' cells
+            headers = raw_df.iloc[:3].fillna('').astype(str).apply(lambda s: s.str.strip())
+            headers = headers.where((headers != '') & (headers != 'nan'))
             
-            # Build proper column names by combining headers
-            columns = []
-            for i in range(len(header_row1)):
-                h1 = str(header_row1.iloc[i]).strip()
-                h2 = str(header_row2.iloc[i]).strip()
-                h3 = str(header_row3.iloc[i]).strip()
-                
-                # Combine non-empty parts
-                parts = [p for p in [h1, h2, h3] if p and p != 'nan' and p != '']
-                
-                if parts:
-                    col_name = ' - '.join(parts) if len(parts) > 1 else parts[0]
-                else:
-                    col_name = f'Column_{i}'
-                
-                columns.append(col_name)
+            # Build proper column names by combining the non-empty header parts
+            columns = headers.apply(lambda col: ' - '.join(col.dropna()) or f'Column_{col.name}')
             
             # Extract data (skip first 3 header rows and any empty rows after)
             data_df = raw_df.iloc[3:].copy()
-            data_df.columns = columns
-            
-            # Remove rows where key identifiers are missing
-            data_df = data_df.dropna(subset=[col for col in data_df.columns if 'Subject' in col or 'Site' in col], how='all')
+            data_df.columns = columns.tolist()
             
-            # Clean up: remove completely empty rows
-            data_df = data_df.replace('', np.nan)
-            data_df = data_df.dropna(how='all')
+            # Keep rows that have a key identifier and are not completely empty
+            id_cols = [col for col in data_df.columns if 'Subject' in col or 'Site' in col]
+            keep = data_df[id_cols].notna().any(axis=1)
+            data_df.replace('', np.nan, inplace=True)
+            keep &= data_df.notna().any(axis=1)
+            data_df = data_df.loc[keep]
             
             # Convert numeric columns
-            for col in data_df.columns:
-                if any(keyword in col for keyword in ['Missing', '#', 'Open', 'Closed', 'Total', 'Count']):
-                    data_df[col] = pd.to_numeric(data_df[col], errors='coerce').fillna(0)
+            num_cols = data_df.columns[data_df.columns.str.contains(_NUMERIC_COL_RE)]
+            data_df[num_cols] = data_df[num_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
             
             logger.debug(f"Parsed EDC file with {len(data_df)} rows and columns: {list(data_df.columns[:10])}")
-            return data_df
+            # Arrow-backed columns are shared rather than copied by downstream concat
+            return data_df.convert_dtypes(dtype_backend='pyarrow')
             
         except Exception as e:
             logger.error(f"Error parsing EDC metrics file {file_path.name}: {e}")
@@ -175,10 +191,9 @@ class DataIngestionEngine:
     def _load_missing_pages_file(self, file_path: Path) -> pd.DataFrame:
         """Load missing pages report file"""
         try:
-            df = pd.read_excel(file_path, engine='openpyxl')
+            df = pd.read_excel(file_path, engine=EXCEL_ENGINE, dtype_backend='pyarrow')
             # Clean up column names
-            df.columns = df.columns.str.strip()
-            return df
+            return _strip_columns(df)
         except Exception as e:
             logger.error(f"Error parsing missing pages file {file_path.name}: {e}")
             return pd.DataFrame()
@@ -186,10 +201,9 @@ class DataIngestionEngine:
     def _load_sae_file(self, file_path: Path) -> pd.DataFrame:
         """Load SAE dashboard file"""
         try:
-            df = pd.read_excel(file_path, engine='openpyxl')
+            df = pd.read_excel(file_path, engine=EXCEL_ENGINE, dtype_backend='pyarrow')
             # Clean up column names
-            df.columns = df.columns.str.strip()
-            return df
+            return _strip_columns(df)
         except Exception as e:
             logger.error(f"Error parsing SAE file {file_path.name}: {e}")
             return pd.DataFrame()
@@ -207,29 +221,10 @@ class DataIngestionEngine:
         file_name_lower = file_name.lower()
         
         # Classification rules based on hackathon dataset patterns
-        if "edc_metrics" in file_name_lower or "cpid" in file_name_lower:
-            return "edc_metrics"
-        elif "missing_pages" in file_name_lower or "missing pages" in file_name_lower:
-            return "missing_pages"
-        elif "sae" in file_name_lower and "dashboard" in file_name_lower:
-            return "sae_dashboard"
-        elif "coding" in file_name_lower:
-            if "meddra" in file_name_lower:
-                return "coding_meddra"
-            elif "who" in file_name_lower:
-                return "coding_whodd"
-            else:
-                return "coding_report"
-        elif "lab" in file_name_lower and ("missing" in file_name_lower or "range" in file_name_lower):
-            return "lab_report"
-        elif "visit" in file_name_lower and "projection" in file_name_lower:
-            return "visit_projection"
-        elif "inactivated" in file_name_lower:
-            return "inactivated_forms"
-        elif "edrr" in file_name_lower:
-            return "edrr"
-        else:
-            return None
+        for pattern, file_type in _FILE_TYPE_RULES:
+            if pattern.search(file_name_lower):
+                return file_type
+        return None
     
     def ingest_study_data(self, study_name: str) -> Dict[str, pd.DataFrame]:
         """
@@ -239,7 +234,8 @@ class DataIngestionEngine:
             study_name: Name of the study folder
             
         Returns:
-            Dictionary mapping file types to DataFrames
+            Dictionary mapping file types to DataFrames, each carrying _study,
+            _file_source and _ingestion_timestamp in DataFrame.attrs
         """
         study_path = self.data_directory / study_name
         study_data = {}
@@ -253,22 +249,33 @@ class DataIngestionEngine:
         # Find all Excel files in the study directory
         excel_files = list(study_path.glob("*.xlsx")) + list(study_path.glob("*.xls"))
         
+        classified_files = []
         for file_path in excel_files:
             file_type = self.classify_file_type(file_path.name)
-            
             if file_type:
-                df = self.load_excel_file(file_path)
-                if df is not None:
-                    # Add metadata columns
-                    df['_study'] = study_name
-                    df['_file_source'] = file_path.name
-                    df['_ingestion_timestamp'] = self.ingestion_metadata["timestamp"]
-                    
-                    study_data[file_type] = df
-                    logger.info(f"Classified {file_path.name} as {file_type}")
+                classified_files.append((file_path, file_type))
             else:
                 logger.warning(f"Could not classify file: {file_path.name}")
         
+        if not classified_files:
+            return study_data
+        
+        # Each workbook read is independent and I/O bound, so load them concurrently
+        with ThreadPoolExecutor(max_workers=min(4, len(classified_files))) as executor:
+            frames = list(executor.map(self.load_excel_file, [file_path for file_path, _ in classified_files]))
+        
+        for (file_path, file_type), df in zip(classified_files, frames):
+            if df is not None:
+                # Attach per-file metadata as attrs rather than constant full-length columns
+                df.attrs.update({
+                    "_study": study_name,
+                    "_file_source": file_path.name,
+                    "_ingestion_timestamp": self.ingestion_metadata["timestamp"]
+                })
+                
+                study_data[file_type] = df
+                logger.info(f"Classified {file_path.name} as {file_type}")
+        
         return study_data
     
     def ingest_all_studies(self) -> Dict[str, Dict[str, pd.DataFrame]]:
@@ -283,10 +290,14 @@ class DataIngestionEngine:
         
         logger.info(f"Starting ingestion of {len(studies)} studies")
         
-        for study in studies:
-            study_data = self.ingest_study_data(study)
-            if study_data:
-                all_data[study] = study_data
+        if not studies:
+            return all_data
+        
+        # Studies are independent and dominated by Excel I/O, so load them concurrently
+        with ThreadPoolExecutor(max_workers=min(8, len(studies))) as executor:
+            for study, study_data in zip(studies, executor.map(self.ingest_study_data, studies)):
+                if study_data:
+                    all_data[study] = study_data
         
         logger.info(f"Ingestion complete. Processed {len(all_data)} studies")
         return all_data
@@ -321,12 +332,12 @@ def validate_dataframe(df: pd.DataFrame, required_columns: List[str]) -> Tuple[b
     if df is None or df.empty:
         return False, required_columns
     
-    df_columns = [col.lower().strip() for col in df.columns]
+    df_columns = {col.lower().strip() for col in df.columns}
     missing = []
     
     for req_col in required_columns:
-        req_col_variants = [req_col.lower().strip(), req_col.lower().replace(" ", ""), req_col.lower().replace("_", "")]
-        if not any(variant in df_columns for variant in req_col_variants):
+        req_col_variants = {req_col.lower().strip(), req_col.lower().replace(" ", ""), req_col.lower().replace("_", "")}
+        if req_col_variants.isdisjoint(df_columns):
             missing.append(req_col)
     
     return len(missing) == 0, missing
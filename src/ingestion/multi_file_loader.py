@@ -2,12 +2,65 @@
 Multi-File Data Loader - Loads clinical trial metrics from multiple specialized Excel files
 Implements robust subject-level aggregation pipeline for clean rate calculation
 """
+import hashlib
+import os
+import threading
 import pandas as pd
 import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from fnmatch import fnmatch, fnmatchcase
+from io import BytesIO
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from loguru import logger
 
+try:
+    import python_calamine  # noqa: F401
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Rust-based calamine parses xlsx several times faster than openpyxl
+EXCEL_ENGINE = "calamine" if CALAMINE_AVAILABLE else "openpyxl"
+
+# Join key dtype: subject ids are hashed from contiguous Arrow UTF-8 buffers when
+# pyarrow is available; the returned frame keeps plain object subject ids
+SUBJECT_ID_DTYPE = pd.ArrowDtype(pa.string()) if PYARROW_AVAILABLE else str
+
+# Version of the Parquet cache key; bump it whenever the read filters below or
+# the way a report is parsed change, so stale copies are never read back
+PARQUET_CACHE_VERSION = 1
+
+
+# read_excel usecols filters: reports whose aggregation needs only a few columns
+# are projected at parse time. Named functions keep the Parquet cache key stable.
+def _subject_columns(col) -> bool:
+    """Keep every column _find_subject_column could pick"""
+    return 'subject' in str(col).lower()
+
+
+def _edrr_columns(col) -> bool:
+    """Keep subject columns and the open-issue count columns"""
+    col_lower = str(col).lower()
+    return 'subject' in col_lower or ('open' in col_lower and 'count' in col_lower)
+
+
+def _coding_columns(col) -> bool:
+    """Keep subject columns and the coding status"""
+    return _subject_columns(col) or col == 'Coding Status'
+
+
+def _form_columns(col) -> bool:
+    """Keep form and folder columns"""
+    col_lower = str(col).lower()
+    return 'form' in col_lower or 'folder' in col_lower
+
 
 class MultiFileDataLoader:
     """
@@ -26,9 +79,27 @@ class MultiFileDataLoader:
     9. Calculate clean rate
     """
     
-    def __init__(self, data_directory: Path):
-        """Initialize with data directory path"""
+    def __init__(self, data_directory: Path, cache_directory: Optional[Path] = None):
+        """
+        Initialize with data directory path
+        
+        Args:
+            data_directory: Folder holding one sub-folder per study
+            cache_directory: Folder for Parquet copies of parsed reports;
+                caching is disabled when not given
+        """
         self.data_directory = Path(data_directory)
+        self.cache_directory = Path(cache_directory) if cache_directory else None
+        # In-memory report files (name -> bytes) set by load_from_buffers
+        self._buffers: Optional[Dict[str, bytes]] = None
+        # Study folder -> file names, listed once per load_study_data call
+        self._listings: Dict[Path, List[str]] = {}
+        # (column kind, column names) -> matching column; the same reports are
+        # read by several pipeline steps, so each header layout is scanned once
+        self._column_lookup: Dict[tuple, Optional[str]] = {}
+        # Study folder -> (file name, read options) -> parsed report; several
+        # steps read the same reports, so each is parsed once per load
+        self._frames: Dict[Path, Dict[tuple, Future]] = {}
         logger.info(f"MultiFileDataLoader initialized with directory: {data_directory}")
     
     def load_study_data(self, study_name: str) -> Optional[pd.DataFrame]:
@@ -48,6 +119,37 @@ class MultiFileDataLoader:
             logger.error(f"Study path does not exist: {study_path}")
             return None
         
+        # Every report lookup in the pipeline matches against this one listing
+        self._listings[study_path] = [path.name for path in study_path.iterdir()]
+        self._frames[study_path] = {}
+        try:
+            return self._run_pipeline(study_path, study_name)
+        finally:
+            self._listings.pop(study_path, None)
+            self._frames.pop(study_path, None)
+    
+    def load_from_buffers(self, study_name: str, buffers: Dict[str, bytes]) -> Optional[pd.DataFrame]:
+        """
+        Load a study from in-memory report files instead of a study folder
+        
+        Args:
+            study_name: Name of the study
+            buffers: Mapping of report file name to its raw Excel bytes
+            
+        Returns:
+            DataFrame with consolidated subject-level metrics including clean_rate
+        """
+        study_path = self.data_directory / study_name
+        self._buffers = dict(buffers)
+        self._frames[study_path] = {}
+        try:
+            return self._run_pipeline(study_path, study_name)
+        finally:
+            self._buffers = None
+            self._frames.pop(study_path, None)
+    
+    def _run_pipeline(self, study_path: Path, study_name: str) -> Optional[pd.DataFrame]:
+        """Run the aggregation pipeline over the report files of one study"""
         logger.info(f"Loading data for {study_name} using robust pipeline")
         
         # Step 1: Load master subject list (the denominator)
@@ -58,25 +160,29 @@ class MultiFileDataLoader:
         
         logger.info(f"Step 1 complete: {len(subject_master)} subjects in master list")
         
-        # Step 2: Load and aggregate missing visits
-        missing_visits_agg = self._aggregate_missing_visits(study_path)
-        logger.info(f"Step 2 complete: Missing visits loaded")
-        
-        # Step 3: Load and aggregate missing pages (excluding inactivated)
-        missing_pages_agg = self._aggregate_missing_pages(study_path)
-        logger.info(f"Step 3 complete: Missing pages loaded")
-        
-        # Step 4: Load and aggregate open queries
-        open_queries_agg = self._aggregate_open_queries(study_path)
-        logger.info(f"Step 4 complete: Open queries loaded")
-        
-        # Step 5: Load and aggregate pending SDV
-        pending_sdv_agg = self._aggregate_pending_sdv(study_path)
-        logger.info(f"Step 5 complete: Pending SDV loaded")
-        
-        # Step 6: Load and aggregate open safety issues
-        safety_issues_agg = self._aggregate_safety_issues(study_path)
-        logger.info(f"Step 6 complete: Safety issues loaded")
+        # Steps 2-6 read independent reports, so their Excel loads run concurrently
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            # Step 2: Load and aggregate missing visits
+            missing_visits_future = executor.submit(self._aggregate_missing_visits, study_path)
+            # Step 3: Load and aggregate missing pages (excluding inactivated)
+            missing_pages_future = executor.submit(self._aggregate_missing_pages, study_path)
+            # Step 4: Load and aggregate open queries
+            open_queries_future = executor.submit(self._aggregate_open_queries, study_path)
+            # Step 5: Load and aggregate pending SDV
+            pending_sdv_future = executor.submit(self._aggregate_pending_sdv, study_path)
+            # Step 6: Load and aggregate open safety issues
+            safety_issues_future = executor.submit(self._aggregate_safety_issues, study_path)
+            
+            missing_visits_agg = missing_visits_future.result()
+            logger.info(f"Step 2 complete: Missing visits loaded")
+            missing_pages_agg = missing_pages_future.result()
+            logger.info(f"Step 3 complete: Missing pages loaded")
+            open_queries_agg = open_queries_future.result()
+            logger.info(f"Step 4 complete: Open queries loaded")
+            pending_sdv_agg = pending_sdv_future.result()
+            logger.info(f"Step 5 complete: Pending SDV loaded")
+            safety_issues_agg = safety_issues_future.result()
+            logger.info(f"Step 6 complete: Safety issues loaded")
         
         # Step 7: Join all metrics to subject_master (left join)
         consolidated = self._join_all_metrics(
@@ -111,13 +217,13 @@ class MultiFileDataLoader:
         """
         try:
             # Look for EDC Metrics file
-            edc_files = list(study_path.glob('*EDC*Metrics*.xlsx'))
+            edc_files = self._glob(study_path, '*EDC*Metrics*.xlsx')
             if not edc_files:
                 logger.warning(f"No EDC Metrics file found for {study_name}")
                 # Fallback: gather subjects from all available files
                 return self._fallback_subject_master(study_path, study_name)
             
-            df = pd.read_excel(edc_files[0])
+            df = self._read_excel(edc_files[0])
             logger.debug(f"Loaded EDC Metrics: {len(df)} rows, columns: {list(df.columns[:10])}")
             
             # Find subject column
@@ -126,41 +232,28 @@ class MultiFileDataLoader:
                 logger.error("Subject ID column not found in EDC Metrics")
                 return None
             
-            # Extract subject-level master data
-            master = df[[subject_col]].copy()
-            master.columns = ['subject_id']
-            
-            # Add site_id if available
+            # Optional attribute columns: site, country, region and subject status;
+            # headers are lowercased once for the three name scans
             site_col = self._find_site_column(df)
-            if site_col:
-                master['site_id'] = df[site_col]
-            else:
-                master['site_id'] = None
-            
-            # Add country if available
-            country_cols = [c for c in df.columns if 'country' in c.lower()]
-            if country_cols:
-                master['country'] = df[country_cols[0]]
-            else:
-                master['country'] = None
-            
-            # Add region if available
-            region_cols = [c for c in df.columns if 'region' in c.lower()]
-            if region_cols:
-                master['region'] = df[region_cols[0]]
-            else:
-                master['region'] = None
-            
-            # Add subject status if available
-            status_cols = [c for c in df.columns if 'status' in c.lower() and 'subject' in c.lower()]
-            if status_cols:
-                master['subject_status'] = df[status_cols[0]]
-            else:
-                master['subject_status'] = 'Unknown'
+            columns_lower = [(c, c.lower()) for c in df.columns]
+            country_cols = [c for c, c_lower in columns_lower if 'country' in c_lower]
+            region_cols = [c for c, c_lower in columns_lower if 'region' in c_lower]
+            status_cols = [c for c, c_lower in columns_lower if 'status' in c_lower and 'subject' in c_lower]
+            
+            # Extract subject-level master data column-wise in one construction;
+            # attributes that are not available fall back to a constant, so the
+            # frame is never mutated column by column afterwards
+            master = pd.DataFrame({
+                'subject_id': df[subject_col],
+                'site_id': df[site_col] if site_col else None,
+                'country': df[country_cols[0]] if country_cols else None,
+                'region': df[region_cols[0]] if region_cols else None,
+                'subject_status': df[status_cols[0]] if status_cols else 'Unknown',
+                'study_id': study_name
+            })
             
             # Deduplicate by subject_id
-            master = master.drop_duplicates(subset=['subject_id']).reset_index(drop=True)
-            master['study_id'] = study_name
+            master = master.drop_duplicates(subset=['subject_id'], ignore_index=True)
             
             logger.info(f"Master subject list: {len(master)} unique subjects")
             return master
@@ -171,28 +264,26 @@ class MultiFileDataLoader:
     
     def _fallback_subject_master(self, study_path: Path, study_name: str) -> Optional[pd.DataFrame]:
         """Fallback: gather unique subjects from all available files"""
-        all_subjects = set()
-        all_data = []
+        # Union of subject ids across reports, deduplicated over the arrays
+        all_subjects = pd.Index([])
         
         # Try each file type
         for pattern in ['*Missing_Pages*.xlsx', '*Visit*Projection*.xlsx', '*EDRR*.xlsx', '*SAE*.xlsx']:
-            files = list(study_path.glob(pattern))
+            files = self._glob(study_path, pattern)
             if files:
                 try:
-                    df = pd.read_excel(files[0])
+                    df = self._read_excel(files[0], usecols=_subject_columns)
                     subject_col = self._find_subject_column(df)
                     if subject_col:
-                        subjects = df[subject_col].unique()
-                        all_subjects.update(subjects)
-                        all_data.append(df)
+                        all_subjects = all_subjects.union(df[subject_col].unique(), sort=False)
                 except:
                     continue
         
-        if not all_subjects:
+        if all_subjects.empty:
             return None
         
         master = pd.DataFrame({
-            'subject_id': sorted(list(all_subjects)),
+            'subject_id': all_subjects.sort_values(),
             'site_id': None,
             'country': None,
             'region': None,
@@ -211,21 +302,140 @@ class MultiFileDataLoader:
             DataFrame with columns: subject_id, missing_visits
         """
     
+    def _glob(self, study_path: Path, pattern: str) -> List[Path]:
+        """List the study's report files matching a glob pattern"""
+        if self._buffers is not None:
+            return [study_path / name for name in self._buffers if fnmatchcase(name, pattern)]
+        names = self._listings.get(study_path)
+        if names is None:
+            return list(study_path.glob(pattern))
+        # fnmatch follows the platform's case rules, like Path.glob
+        return [study_path / name for name in names if fnmatch(name, pattern)]
+    
+    def _read_excel(self, file_path: Path, **kwargs) -> pd.DataFrame:
+        """
+        Read an Excel report, parsing each report and option set once per study load
+        
+        Steps that run concurrently share one parse: the first caller parses
+        and later callers wait on its result. Callers must not modify the
+        returned frame in place.
+        
+        Args:
+            file_path: Path to the Excel report
+            **kwargs: Extra read_excel arguments
+            
+        Returns:
+            Parsed report DataFrame
+        """
+        frames = self._frames.get(file_path.parent)
+        if frames is None:
+            return self._parse_excel(file_path, **kwargs)
+        
+        future = Future()
+        shared = frames.setdefault((file_path.name, tuple(sorted(kwargs.items()))), future)
+        if shared is future:
+            try:
+                future.set_result(self._parse_excel(file_path, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        return shared.result()
+    
+    def _parse_excel(self, file_path: Path, **kwargs) -> pd.DataFrame:
+        """Parse an Excel report with the fastest available engine"""
+        if self._buffers is not None:
+            # Fresh stream per read; a report may be parsed more than once
+            return pd.read_excel(BytesIO(self._buffers[file_path.name]), engine=EXCEL_ENGINE, **kwargs)
+        if self.cache_directory is None or 'nrows' in kwargs:
+            # Header probes are cheap to parse and not worth a cached copy
+            return pd.read_excel(file_path, engine=EXCEL_ENGINE, **kwargs)
+        return self._cached_read(file_path, **kwargs)
+    
+    def _cached_read(self, file_path: Path, **kwargs) -> pd.DataFrame:
+        """
+        Read an Excel report through a Parquet copy in the cache directory
+        
+        The copy is used while it is at least as new as the workbook; otherwise
+        the workbook is parsed and the copy rewritten. Caching is best effort:
+        frames Parquet cannot hold and read-only folders are simply not cached.
+        
+        Args:
+            file_path: Path to the Excel report
+            **kwargs: Extra read_excel arguments, which also key the cached copy
+            
+        Returns:
+            Parsed report DataFrame
+        """
+        options = "".join(
+            f".{key}-{getattr(value, '__name__', value)}" for key, value in sorted(kwargs.items())
+        )
+        # Reports from different studies often share a name; the source path
+        # and the cache version keep their copies apart
+        source_key = hashlib.sha1(str(file_path.resolve()).encode()).hexdigest()[:12]
+        cache_path = (
+            self.cache_directory
+            / f"v{PARQUET_CACHE_VERSION}-{source_key}-{file_path.stem}{options}.parquet"
+        )
+        
+        try:
+            if cache_path.stat().st_mtime >= file_path.stat().st_mtime:
+                cached = pd.read_parquet(cache_path, engine="pyarrow")
+                # Parquet returns empty text cells as None; read_excel gives NaN
+                text_cols = cached.select_dtypes(include="object").columns
+                cached[text_cols] = cached[text_cols].where(cached[text_cols].notna(), np.nan)
+                return cached
+        except Exception as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.debug(f"Ignoring Parquet cache for {file_path.name}: {e}")
+        
+        df = pd.read_excel(file_path, engine=EXCEL_ENGINE, **kwargs)
+        if not all(isinstance(col, str) for col in df.columns):
+            # Parquet would store these headers as strings
+            return df
+        
+        # Write to a per-thread temp file and rename, so concurrent readers
+        # never see a partial copy
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.debug(f"Could not cache {file_path.name} as Parquet: {e}")
+        
+        return df
+    
+    def _read_visit_projection(self, file_path: Path) -> pd.DataFrame:
+        """Read the Visit Projection Tracker, skipping its banner rows when present"""
+        # Probe only the header and first row; the sheet is then parsed once
+        probe = self._read_excel(file_path, nrows=1)
+        
+        # Handle header rows
+        if 'Unnamed' in str(probe.columns[0]) or (len(probe) > 0 and 'Restricted' in str(probe.iloc[0, 0])):
+            return self._read_excel(file_path, skiprows=2)
+        return self._read_excel(file_path)
+    
     def _find_subject_column(self, df: pd.DataFrame) -> Optional[str]:
         """Find the subject column name (handles variations)"""
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'subject' in col_lower and 'status' not in col_lower:
-                return col
-        return None
+        key = ('subject', tuple(df.columns))
+        if key not in self._column_lookup:
+            self._column_lookup[key] = next(
+                (col for col, col_lower in ((col, col.lower()) for col in df.columns)
+                 if 'subject' in col_lower and 'status' not in col_lower),
+                None
+            )
+        return self._column_lookup[key]
     
     def _find_site_column(self, df: pd.DataFrame) -> Optional[str]:
         """Find the site column name (handles variations)"""
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'site' in col_lower and ('number' in col_lower or 'id' in col_lower or col_lower == 'site'):
-                return col
-        return None
+        key = ('site', tuple(df.columns))
+        if key not in self._column_lookup:
+            self._column_lookup[key] = next(
+                (col for col, col_lower in ((col, col.lower()) for col in df.columns)
+                 if 'site' in col_lower and ('number' in col_lower or 'id' in col_lower or col_lower == 'site')),
+                None
+            )
+        return self._column_lookup[key]
     
     def _aggregate_missing_visits(self, study_path: Path) -> pd.DataFrame:
         """
@@ -235,16 +445,12 @@ class MultiFileDataLoader:
             DataFrame with columns: subject_id, missing_visits
         """
         try:
-            files = list(study_path.glob('*Visit*Projection*.xlsx'))
+            files = self._glob(study_path, '*Visit*Projection*.xlsx')
             if not files:
                 logger.debug("No visit projection file found")
                 return pd.DataFrame(columns=['subject_id', 'missing_visits'])
             
-            df = pd.read_excel(files[0])
-            
-            # Handle header rows
-            if 'Unnamed' in str(df.columns[0]) or (len(df) > 0 and 'Restricted' in str(df.iloc[0, 0])):
-                df = pd.read_excel(files[0], skiprows=2)
+            df = self._read_visit_projection(files[0])
             
             subject_col = self._find_subject_column(df)
             if not subject_col:
@@ -274,24 +480,29 @@ class MultiFileDataLoader:
         """
         try:
             # Load missing pages
-            files = list(study_path.glob('*Missing_Pages*.xlsx'))
+            files = self._glob(study_path, '*Missing_Pages*.xlsx')
             if not files:
                 logger.debug("No missing pages file found")
                 return pd.DataFrame(columns=['subject_id', 'missing_pages'])
             
-            df = pd.read_excel(files[0])
+            df = self._read_excel(files[0])
             subject_col = self._find_subject_column(df)
             
             if not subject_col:
                 logger.debug("No subject column in missing pages")
                 return pd.DataFrame(columns=['subject_id', 'missing_pages'])
             
+            # Nothing to filter: skip the inactivated-forms and due-visit reads
+            if df.empty:
+                logger.info("No missing pages after filtering")
+                return pd.DataFrame(columns=['subject_id', 'missing_pages'])
+            
             # Load inactivated forms to exclude them
             inactivated_forms = set()
-            inactivated_files = list(study_path.glob('*Inactivated*.xlsx'))
+            inactivated_files = self._glob(study_path, '*Inactivated*.xlsx')
             if inactivated_files:
                 try:
-                    inact_df = pd.read_excel(inactivated_files[0])
+                    inact_df = self._read_excel(inactivated_files[0], usecols=_form_columns)
                     form_cols = [c for c in inact_df.columns if 'form' in c.lower() or 'folder' in c.lower()]
                     if form_cols:
                         inactivated_forms = set(inact_df[form_cols[0]].dropna().unique())
@@ -300,7 +511,8 @@ class MultiFileDataLoader:
                     pass
             
             # Filter out inactivated forms
-            form_cols = [c for c in df.columns if 'form' in c.lower() or 'folder' in c.lower()]
+            columns_lower = [(c, c.lower()) for c in df.columns]
+            form_cols = [c for c, c_lower in columns_lower if 'form' in c_lower or 'folder' in c_lower]
             if form_cols and inactivated_forms:
                 initial_count = len(df)
                 df = df[~df[form_cols[0]].isin(inactivated_forms)]
@@ -312,24 +524,28 @@ class MultiFileDataLoader:
             
             if not due_visits.empty:
                 # Filter missing pages to only include due visits
-                visit_cols = [c for c in df.columns if 'visit' in c.lower() and 'missing' not in c.lower()]
+                visit_cols = [c for c, c_lower in columns_lower if 'visit' in c_lower and 'missing' not in c_lower]
                 if visit_cols and subject_col in df.columns:
-                    # Create a key to match with due_visits
-                    df['_key'] = df[subject_col].astype(str) + '_' + df[visit_cols[0]].astype(str)
-                    due_visits['_key'] = due_visits['subject_id'].astype(str) + '_' + due_visits['visit_name'].astype(str)
+                    # Match (subject, visit) pairs through a hashed MultiIndex
+                    # rather than building concatenated string keys
+                    due_keys = pd.MultiIndex.from_arrays(
+                        [due_visits['subject_id'].astype(str), due_visits['visit_name'].astype(str)]
+                    )
+                    page_keys = pd.MultiIndex.from_arrays(
+                        [df[subject_col].astype(str), df[visit_cols[0]].astype(str)]
+                    )
                     
                     initial_count = len(df)
-                    df = df[df['_key'].isin(due_visits['_key'])]
+                    df = df[page_keys.isin(due_keys)]
                     
                     if len(df) == 0:
                         logger.warning(f"Due visits filter removed ALL missing pages ({initial_count} → 0). This likely means visit names don't match. Falling back to count all missing pages.")
                         # Reload without filter
-                        df = pd.read_excel(files[0])
+                        df = self._read_excel(files[0])
                         if form_cols and inactivated_forms:
                             df = df[~df[form_cols[0]].isin(inactivated_forms)]
                     else:
                         logger.info(f"Filtered to DUE visits only: {initial_count} → {len(df)} missing pages (removed {initial_count - len(df)} future/not-due pages)")
-                        df = df.drop(columns=['_key'])
                 else:
                     logger.warning("Could not filter by due visits - visit column not found in missing pages")
             else:
@@ -363,16 +579,12 @@ class MultiFileDataLoader:
             DataFrame with columns: subject_id, visit_name, is_due
         """
         try:
-            files = list(study_path.glob('*Visit*Projection*.xlsx'))
+            files = self._glob(study_path, '*Visit*Projection*.xlsx')
             if not files:
                 logger.debug("No visit projection file - cannot determine due visits")
                 return pd.DataFrame(columns=['subject_id', 'visit_name', 'is_due'])
             
-            df = pd.read_excel(files[0])
-            
-            # Handle header rows
-            if 'Unnamed' in str(df.columns[0]) or (len(df) > 0 and 'Restricted' in str(df.iloc[0, 0])):
-                df = pd.read_excel(files[0], skiprows=2)
+            df = self._read_visit_projection(files[0])
             
             subject_col = self._find_subject_column(df)
             if not subject_col:
@@ -427,17 +639,18 @@ class MultiFileDataLoader:
         
         try:
             # Load EDRR issues
-            edrr_files = list(study_path.glob('*EDRR*.xlsx'))
+            edrr_files = self._glob(study_path, '*EDRR*.xlsx')
             if edrr_files:
-                df = pd.read_excel(edrr_files[0])
+                df = self._read_excel(edrr_files[0], usecols=_edrr_columns)
                 subject_col = self._find_subject_column(df)
                 
                 if subject_col:
                     # Check if there's a count column
                     count_cols = [c for c in df.columns if 'open' in c.lower() and 'count' in c.lower()]
                     if count_cols:
-                        # Use the count directly
-                        agg = df.groupby(subject_col)[count_cols[0]].first().reset_index()
+                        # Use the count directly; only each subject's first recorded
+                        # count is needed, so drop repeated rows instead of grouping
+                        agg = df[[subject_col, count_cols[0]]].dropna().drop_duplicates(subset=[subject_col])
                         agg.columns = ['subject_id', 'open_queries']
                         agg['open_queries'] = pd.to_numeric(agg['open_queries'], errors='coerce').fillna(0)
                         all_queries.append(agg)
@@ -448,9 +661,9 @@ class MultiFileDataLoader:
                         all_queries.append(agg)
             
             # Load SAE issues (each is an open query for review)
-            sae_files = list(study_path.glob('*SAE*.xlsx'))
+            sae_files = self._glob(study_path, '*SAE*.xlsx')
             if sae_files:
-                df = pd.read_excel(sae_files[0])
+                df = self._read_excel(sae_files[0], usecols=_subject_columns)
                 subject_col = self._find_subject_column(df)
                 
                 if subject_col:
@@ -459,17 +672,17 @@ class MultiFileDataLoader:
                     all_queries.append(agg)
             
             # Load coding issues (uncoded = open queries)
-            coding_files = list(study_path.glob('*MedDRA*.xlsx')) + list(study_path.glob('*WHODD*.xlsx'))
+            coding_files = self._glob(study_path, '*MedDRA*.xlsx') + self._glob(study_path, '*WHODD*.xlsx')
             if coding_files:
                 for file in coding_files:
-                    df = pd.read_excel(file)
+                    df = self._read_excel(file, usecols=_coding_columns)
                     subject_col = self._find_subject_column(df)
                     
                     if subject_col and 'Coding Status' in df.columns:
-                        # Only count uncoded items
-                        uncoded = df[df['Coding Status'] != 'Coded Term']
-                        if not uncoded.empty:
-                            agg = uncoded.groupby(subject_col).size().reset_index()
+                        # Only count uncoded items; select just the subject ids, not whole rows
+                        uncoded_ids = df.loc[df['Coding Status'] != 'Coded Term', subject_col]
+                        if not uncoded_ids.empty:
+                            agg = uncoded_ids.value_counts(sort=False).reset_index()
                             agg.columns = ['subject_id', 'coding_queries']
                             all_queries.append(agg)
             
@@ -504,9 +717,9 @@ class MultiFileDataLoader:
         """
         try:
             # Look for SDV data in EDC Metrics or separate SDV file
-            edc_files = list(study_path.glob('*EDC*Metrics*.xlsx'))
+            edc_files = self._glob(study_path, '*EDC*Metrics*.xlsx')
             if edc_files:
-                df = pd.read_excel(edc_files[0])
+                df = self._read_excel(edc_files[0])
                 subject_col = self._find_subject_column(df)
                 
                 if subject_col:
@@ -536,12 +749,12 @@ class MultiFileDataLoader:
             DataFrame with columns: subject_id, open_safety_issues
         """
         try:
-            sae_files = list(study_path.glob('*SAE*.xlsx'))
+            sae_files = self._glob(study_path, '*SAE*.xlsx')
             if not sae_files:
                 logger.debug("No SAE file found")
                 return pd.DataFrame(columns=['subject_id', 'open_safety_issues'])
             
-            df = pd.read_excel(sae_files[0])
+            df = self._read_excel(sae_files[0], usecols=_subject_columns)
             subject_col = self._find_subject_column(df)
             
             if not subject_col:
@@ -575,35 +788,33 @@ class MultiFileDataLoader:
         Returns:
             Consolidated DataFrame with all metrics
         """
-        consolidated = subject_master.copy()
-        
         # Convert subject_id to string in master to ensure consistent type
-        consolidated['subject_id'] = consolidated['subject_id'].astype(str)
-        
-        # Left join each metric
-        for metric_df, metric_name in [
-            (missing_visits, 'missing_visits'),
-            (missing_pages, 'missing_pages'),
-            (open_queries, 'open_queries'),
-            (pending_sdv, 'pending_sdv'),
-            (safety_issues, 'open_safety_issues')
-        ]:
-            if not metric_df.empty:
-                # Convert subject_id to string in metric DataFrame too
-                metric_df = metric_df.copy()
-                metric_df['subject_id'] = metric_df['subject_id'].astype(str)
-                consolidated = consolidated.merge(metric_df, on='subject_id', how='left')
-            else:
-                # Add column with zeros if metric not available
-                consolidated[metric_name] = 0
+        consolidated = subject_master.assign(
+            subject_id=subject_master['subject_id'].astype(str).astype(SUBJECT_ID_DTYPE)
+        )
         
-        # Fill any remaining NaN with 0
+        # Index each available metric by string subject_id so all of them
+        # left-join onto the master in a single hash join
+        indexed_metrics = [
+            metric_df.assign(
+                subject_id=metric_df['subject_id'].astype(str).astype(SUBJECT_ID_DTYPE)
+            ).set_index('subject_id')
+            for metric_df in (missing_visits, missing_pages, open_queries, pending_sdv, safety_issues)
+            if not metric_df.empty
+        ]
+        if indexed_metrics:
+            consolidated = consolidated.set_index('subject_id').join(indexed_metrics, how='left').reset_index()
+        
+        # Fill missing values with 0; metrics that were not available become all-zero columns
         metric_cols = ['missing_visits', 'missing_pages', 'open_queries', 'pending_sdv', 'open_safety_issues']
         for col in metric_cols:
             if col in consolidated.columns:
                 consolidated[col] = consolidated[col].fillna(0).astype(int)
             else:
                 consolidated[col] = 0
+        consolidated = consolidated[[*subject_master.columns, *metric_cols]]
+        # The Arrow dtype is only for the join; callers get object subject ids
+        consolidated['subject_id'] = consolidated['subject_id'].astype(object)
         
         logger.debug(f"Consolidated metrics: {len(consolidated)} subjects with {len(consolidated.columns)} columns")
         return consolidated
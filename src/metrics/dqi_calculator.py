@@ -179,10 +179,11 @@ class DataQualityIndex:
         for component in self.weights.keys():
             df[f"dqi_component_{component}"] = [cs.get(component, 0) for cs in component_scores_list]
         
+        risk_counts = df["risk_level"].value_counts()
         logger.info(f"Calculated DQI for {len(df)} subjects. Risk distribution: " +
-                   f"High={sum(1 for r in risk_levels if r == 'High')}, " +
-                   f"Medium={sum(1 for r in risk_levels if r == 'Medium')}, " +
-                   f"Low={sum(1 for r in risk_levels if r == 'Low')}")
+                   f"High={risk_counts.get('High', 0)}, " +
+                   f"Medium={risk_counts.get('Medium', 0)}, " +
+                   f"Low={risk_counts.get('Low', 0)}")
         
         return df
     
@@ -295,7 +295,7 @@ class MetricsEngine:
             "open_queries": "sum"
         }
         
-        site_metrics = edc_df.groupby("site_id").agg(agg_dict).reset_index()
+        site_metrics = edc_df.groupby("site_id", observed=True).agg(agg_dict).reset_index()
         site_metrics.columns = ["site_id", "subject_count", "total_missing_visits", 
                                 "total_missing_pages", "total_open_queries"]
         
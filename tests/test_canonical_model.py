@@ -0,0 +1,136 @@
+"""Unit tests for column harmonization and patient lookups in the canonical data model"""
+import random
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import COLUMN_MAPPINGS  # noqa: E402
+from harmonization.canonical_model import (  # noqa: E402
+    CanonicalDataModel,
+    _COLUMN_MAPPING_INDEX,
+    _STANDARD_NAME_MATCHES,
+)
+
+
+def _reference_renames(columns):
+    """Column scan of the original implementation, without any precomputed lookups"""
+    renamed = {}
+    for standard_name, variations in COLUMN_MAPPINGS.items():
+        for col in columns:
+            col_stripped = str(col).strip()
+            for variation in variations:
+                if variation.lower() in col_stripped.lower() or col_stripped.lower() in variation.lower():
+                    if col not in renamed:
+                        renamed[col] = standard_name
+                    break
+            if col in renamed:
+                break
+    return renamed
+
+
+@pytest.fixture
+def model():
+    return CanonicalDataModel()
+
+
+def test_standard_name_matches_agree_with_variation_scan():
+    for name, matches in _STANDARD_NAME_MATCHES.items():
+        expected = {
+            standard_name for standard_name, variations in _COLUMN_MAPPING_INDEX
+            if any(variation in name or name in variation for variation in variations)
+        }
+        assert matches == expected, name
+
+
+def test_standardize_matches_reference_for_random_layouts(model):
+    pool = [v for vs in COLUMN_MAPPINGS.values() for v in vs] + list(COLUMN_MAPPINGS)
+    pool += ["Foo", " subject ", "Input files - Missing Visits - Total", "Region Name", 3, "Queries"]
+    rng = random.Random(1)
+    for _ in range(500):
+        columns = list(dict.fromkeys(rng.sample(pool, rng.randint(1, 12))))
+        df = pd.DataFrame([[1] * len(columns)], columns=columns)
+        expected = [_reference_renames(columns).get(col, col) for col in columns]
+        # The second call is served from the rename cache
+        assert list(model.standardize_column_names(df, "test").columns) == expected
+        assert list(model.standardize_column_names(df, "test").columns) == expected
+        assert list(df.columns) == columns
+
+
+def test_rename_cache_is_keyed_by_column_order(model):
+    forward = pd.DataFrame([[1, 2]], columns=["Subject", "Subject ID"])
+    backward = pd.DataFrame([[1, 2]], columns=["Subject ID", "Subject"])
+    for df in (forward, backward):
+        expected = [_reference_renames(list(df.columns)).get(col, col) for col in df.columns]
+        assert list(model.standardize_column_names(df, "test").columns) == expected
+    assert len(model._rename_cache) == 2
+
+
+def test_standardize_returns_a_new_frame_per_call(model):
+    df = pd.DataFrame({"Subject ID": ["S1"], "Site": ["A"]})
+    first = model.standardize_column_names(df, "test")
+    second = model.standardize_column_names(df, "test")
+    assert first is not second
+    first["extra"] = 1
+    assert "extra" not in second.columns
+    assert "extra" not in df.columns
+
+
+def test_subject_entity_keeps_rows_that_differ_beyond_the_key(model):
+    edc = pd.DataFrame({
+        "subject_id": ["S1", "S1", "S1", "S2"],
+        "site_id": ["A", "A", "A", "B"],
+        "status": ["Screening", "Enrolled", "Enrolled", "Enrolled"],
+    })
+    subjects = model.extract_subject_entity({"Study 1": {"edc_metrics": edc}})
+    assert subjects["subject_id"].tolist() == ["S1", "S1", "S2"]
+    assert subjects["status"].tolist() == ["Screening", "Enrolled", "Enrolled"]
+
+
+def test_build_canonical_model_keeps_id_columns_as_object(model):
+    consolidated = pd.DataFrame({
+        "subject_id": ["S1", "S2", "S2"],
+        "site_id": ["A", "B", "B"],
+        "country": ["US", None, None],
+    })
+    entities = model.build_canonical_model({"Study 1": consolidated})
+    subjects = entities["subjects"]
+    assert len(subjects) == 2
+    assert (subjects.dtypes == object).all()
+    # New labels can still be written into the id columns
+    subjects["country"] = subjects["country"].fillna("Unknown")
+    assert subjects["country"].tolist() == ["US", "Unknown"]
+
+
+def test_patient_rows_lookup_and_rebuild(model):
+    model.entities["visits"] = pd.DataFrame({
+        "study_id": ["Study 1", "Study 1", "Study 2", "Study 1"],
+        "subject_id": ["S1", "S2", "S1", "S1"],
+        "visit_name": ["V1", "V1", "V1", "V2"],
+    })
+    rows = model._patient_rows("visits", "Study 1", "S1")
+    assert rows["visit_name"].tolist() == ["V1", "V2"]
+    assert list(rows.columns) == ["study_id", "subject_id", "visit_name"]
+    assert model._patient_rows("visits", "Study 3", "S1").empty
+
+    # Replacing the entity frame rebuilds the index
+    model.entities["visits"] = pd.DataFrame({
+        "study_id": ["Study 3"], "subject_id": ["S1"], "visit_name": ["V9"]
+    })
+    assert model._patient_rows("visits", "Study 3", "S1")["visit_name"].tolist() == ["V9"]
+    assert model._patient_rows("visits", "Study 1", "S1").empty
+
+
+def test_unified_patient_view_collects_entities(model):
+    model.entities["subjects"] = pd.DataFrame({
+        "study_id": ["Study 1"], "subject_id": ["S1"], "site_id": ["A"]
+    })
+    model.entities["visits"] = pd.DataFrame({
+        "study_id": ["Study 1", "Study 1"], "subject_id": ["S1", "S2"], "visit_name": ["V1", "V1"]
+    })
+    view = model.get_unified_patient_view("Study 1", "S1")
+    assert view["site_id"] == "A"
+    assert [visit["visit_name"] for visit in view["visits"]] == ["V1"]
@@ -0,0 +1,43 @@
+"""Unit tests for the AI insights critical items table and its action plan context"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(SRC / "dashboard"))
+
+from app import _critical_items, _critical_items_context  # noqa: E402
+
+
+def _metrics(**columns):
+    subject_df = pd.DataFrame({
+        "subject_id": ["S1", "S2", "S3"],
+        "site_id": ["A", "A", "B"],
+        "risk_level": ["High", "Low", "High"],
+        "open_queries": [4, 0, 2],
+        **columns,
+    })
+    return {"subject_metrics": subject_df}
+
+
+def test_critical_items_collect_high_risk_subjects_per_study():
+    critical_df = _critical_items({"Study 1": _metrics(), "Study 2": {"site_metrics": pd.DataFrame()}})
+    assert critical_df["study"].tolist() == ["Study 1", "Study 1"]
+    assert critical_df["subject"].tolist() == ["S1", "S3"]
+    # Fields missing from the subject frame take their default
+    assert critical_df["dqi"].tolist() == [0, 0]
+    assert _critical_items({}).empty
+
+
+def test_critical_items_context_formats_a_null_dqi_row():
+    critical_df = _critical_items({"Study 1": _metrics(dqi=[np.nan, 80.0, 12.34])})
+    assert critical_df["dqi"].dtype == "float64"
+    context = _critical_items_context(critical_df)
+    assert context.splitlines() == [
+        "High-Risk Items:",
+        "- Study Study 1, Subject S1, Site A: DQI=nan, Issues=4",
+        "- Study Study 1, Subject S3, Site B: DQI=12.3, Issues=2",
+    ]
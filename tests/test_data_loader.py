@@ -0,0 +1,61 @@
+"""Unit tests for the Excel engine used by the single-file ingestion engine"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from ingestion import data_loader  # noqa: E402
+from ingestion.data_loader import DataIngestionEngine  # noqa: E402
+
+
+def _write_reports(root: Path):
+    """Write one report per read path, with blank header parts and empty cells"""
+    # EDC metrics: three header rows, blank parts in the upper two, then data
+    pd.DataFrame([
+        ["Project", "Site", None, "Input files", None],
+        [None, None, None, "Missing Visits", "Open Queries"],
+        ["Study", "Site ID", "Subject ID", "Total", "Total"],
+        ["Study 1", "Site 1", "S1", 2, None],
+        ["Study 1", None, "S2", None, 3],
+        [None, None, None, None, None],
+        ["Study 1", "Site 2", "S3", 0, 1],
+    ]).to_excel(root / "Study 1_CPID_EDC_Metrics.xlsx", index=False, header=False)
+    pd.DataFrame({
+        "Subject Name": ["S1", None, "S3"],
+        " Form Name ": ["Vitals", "Labs", None],
+        "Days Missing": [4, None, 10],
+    }).to_excel(root / "Study 1_Global_Missing_Pages_Report.xlsx", index=False)
+    pd.DataFrame({
+        "Subject": ["S3", "S1"],
+        "Review Status": ["Pending", None],
+    }).to_excel(root / "Study 1_eSAE Dashboard.xlsx", index=False)
+    pd.DataFrame({
+        "Subject": ["S1", "S2"],
+        "Visit": ["Week 2", None],
+        "# Days Outstanding": [None, 12],
+    }).to_excel(root / "Study 1_Visit Projection Tracker.xlsx", index=False)
+
+
+def _load_all(root: Path, monkeypatch, engine: str):
+    monkeypatch.setattr(data_loader, "EXCEL_ENGINE", engine)
+    loader = DataIngestionEngine(root)
+    return {path.name: loader.load_excel_file(path) for path in sorted(root.glob("*.xlsx"))}
+
+
+def test_calamine_reads_match_openpyxl(tmp_path, monkeypatch):
+    pytest.importorskip("python_calamine")
+    _write_reports(tmp_path)
+
+    expected = _load_all(tmp_path, monkeypatch, "openpyxl")
+    actual = _load_all(tmp_path, monkeypatch, "calamine")
+
+    assert list(actual) == list(expected)
+    for name, df in expected.items():
+        assert df is not None and not df.empty, name
+        # Same headers, including the joined multi-row EDC headers, and same empty cells
+        assert list(actual[name].columns) == list(df.columns), name
+        pd.testing.assert_frame_equal(actual[name].isna(), df.isna(), obj=name)
+        pd.testing.assert_frame_equal(actual[name], df, obj=name)
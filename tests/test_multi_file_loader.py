@@ -0,0 +1,263 @@
+"""Unit tests for report lookup, read caching and the metric join in the multi-file loader"""
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from harmonization import CanonicalDataModel  # noqa: E402
+from metrics import DataQualityIndex, MetricsEngine  # noqa: E402
+from ingestion import multi_file_loader  # noqa: E402
+from ingestion.multi_file_loader import (  # noqa: E402
+    PARQUET_CACHE_VERSION,
+    MultiFileDataLoader,
+    _edrr_columns,
+)
+
+STUDY = "Study 1"
+
+
+def _write_study(root: Path) -> Path:
+    """Write a small study folder with one report of each kind the pipeline reads"""
+    study_path = root / STUDY
+    study_path.mkdir()
+    pd.DataFrame({
+        "Subject ID": ["S1", "S2", "S3"],
+        "Site ID": ["Site 1", "Site 1", "Site 2"],
+        "Country": ["US", "US", "DE"],
+        "Region": ["NA", "NA", "EU"],
+        "Subject Status": ["Enrolled", "Enrolled", "Screening"],
+        "SDV Pending Pages": [0, 2, 0],
+    }).to_excel(study_path / f"{STUDY}_CPID_EDC_Metrics.xlsx", index=False)
+    pd.DataFrame({
+        "Subject": ["S1", "S1"],
+        "Visit": ["Week 2", "Week 4"],
+        "Visit Status": ["Overdue", "Future"],
+    }).to_excel(study_path / f"{STUDY}_Visit Projection Tracker.xlsx", index=False)
+    pd.DataFrame({
+        "Subject Name": ["S1", "S1", "S3"],
+        "Visit Name": ["Week 2", "Week 4", "Week 2"],
+        "Form Name": ["Vitals", "Vitals", "Labs"],
+    }).to_excel(study_path / f"{STUDY}_Global_Missing_Pages_Report.xlsx", index=False)
+    pd.DataFrame({
+        "Subject": ["S2", "S2"],
+        "Total Open issue Count per subject": [3, 3],
+        "Comment": ["a", "b"],
+    }).to_excel(study_path / f"{STUDY}_Compiled_EDRR.xlsx", index=False)
+    pd.DataFrame({
+        "Subject": ["S3"],
+        "Review Status": ["Pending"],
+    }).to_excel(study_path / f"{STUDY}_eSAE Dashboard.xlsx", index=False)
+    return study_path
+
+
+@pytest.fixture
+def study_dir(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_study(data_dir)
+    return data_dir
+
+
+def _buffers(study_path: Path):
+    return {path.name: path.read_bytes() for path in study_path.iterdir() if path.is_file()}
+
+
+def test_load_study_data_consolidates_metrics(study_dir):
+    df = MultiFileDataLoader(study_dir).load_study_data(STUDY)
+    df = df.set_index("subject_id")
+    assert df.loc["S1", "missing_visits"] == 2
+    # Only the due Week 2 page counts for S1; S3 has no visit projection rows
+    assert df.loc["S1", "missing_pages"] == 1
+    assert df.loc["S2", "open_queries"] == 3
+    assert df.loc["S2", "pending_sdv"] == 2
+    assert df.loc["S3", "open_safety_issues"] == 1
+    assert df["is_clean_patient"].tolist() == [False, False, False]
+    assert df["site_id"].dtype == object
+
+
+def test_load_from_buffers_matches_folder_load(study_dir):
+    loader = MultiFileDataLoader(study_dir)
+    from_folder = loader.load_study_data(STUDY)
+    from_buffers = loader.load_from_buffers(STUDY, _buffers(study_dir / STUDY))
+    pd.testing.assert_frame_equal(from_folder, from_buffers)
+
+
+def test_glob_uses_listing_buffers_and_filesystem(study_dir):
+    study_path = study_dir / STUDY
+    loader = MultiFileDataLoader(study_dir)
+    expected = sorted(study_path.glob("*EDRR*.xlsx"))
+    # Without a listing the filesystem is globbed
+    assert sorted(loader._glob(study_path, "*EDRR*.xlsx")) == expected
+    loader._listings[study_path] = [path.name for path in study_path.iterdir()]
+    assert sorted(loader._glob(study_path, "*EDRR*.xlsx")) == expected
+    assert loader._glob(study_path, "*Lab*.xlsx") == []
+    loader._buffers = {"Study 1_Compiled_EDRR.xlsx": b"", "study 1_compiled_edrr.xlsx": b""}
+    # Buffer names match case-sensitively
+    assert loader._glob(study_path, "*EDRR*.xlsx") == [study_path / "Study 1_Compiled_EDRR.xlsx"]
+
+
+def test_read_excel_parses_each_report_once_per_load(study_dir, monkeypatch):
+    loader = MultiFileDataLoader(study_dir)
+    parses = []
+    parse = MultiFileDataLoader._parse_excel
+
+    def counting_parse(self, file_path, **kwargs):
+        parses.append((file_path.name, tuple(sorted(kwargs))))
+        return parse(self, file_path, **kwargs)
+
+    monkeypatch.setattr(MultiFileDataLoader, "_parse_excel", counting_parse)
+    loader.load_study_data(STUDY)
+    assert parses
+    assert len(parses) == len(set(parses))
+    # Parsed frames are released when the load finishes
+    assert loader._frames == {}
+
+    # Outside a load every read parses again
+    report = study_dir / STUDY / f"{STUDY}_Compiled_EDRR.xlsx"
+    loader._read_excel(report)
+    loader._read_excel(report)
+    assert parses.count((report.name, ())) == 2
+
+
+def test_cached_read_is_disabled_by_default(study_dir):
+    MultiFileDataLoader(study_dir).load_study_data(STUDY)
+    assert not any(path.is_dir() for path in (study_dir / STUDY).iterdir())
+
+
+def test_cached_read_round_trip(study_dir, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    report = study_dir / STUDY / f"{STUDY}_Compiled_EDRR.xlsx"
+    loader = MultiFileDataLoader(study_dir, cache_directory=cache_dir)
+
+    parsed = loader._read_excel(report)
+    projected = loader._read_excel(report, usecols=_edrr_columns)
+    assert list(projected.columns) == ["Subject", "Total Open issue Count per subject"]
+    cached_files = sorted(path.name for path in cache_dir.iterdir())
+    assert len(cached_files) == 2
+    assert all(name.startswith(f"v{PARQUET_CACHE_VERSION}-") for name in cached_files)
+    assert not (study_dir / STUDY / ".cache").exists()
+
+    # Fresh copies are read back without parsing the workbook
+    def fail(*args, **kwargs):
+        raise AssertionError("workbook parsed despite a fresh cached copy")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pd, "read_excel", fail)
+        pd.testing.assert_frame_equal(loader._read_excel(report), parsed)
+        pd.testing.assert_frame_equal(loader._read_excel(report, usecols=_edrr_columns), projected)
+
+
+def test_cached_read_refreshes_stale_copies_and_skips_probes(study_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    report = study_dir / STUDY / f"{STUDY}_Compiled_EDRR.xlsx"
+    loader = MultiFileDataLoader(study_dir, cache_directory=cache_dir)
+
+    loader._read_excel(report)
+    pd.DataFrame({"Subject": ["S9"]}).to_excel(report, index=False)
+    newer = max(path.stat().st_mtime for path in cache_dir.iterdir()) + 10
+    os.utime(report, (newer, newer))
+    assert loader._read_excel(report)["Subject"].tolist() == ["S9"]
+
+    # Header probes are never cached
+    before = sorted(cache_dir.iterdir())
+    loader._read_excel(report, nrows=1)
+    assert sorted(cache_dir.iterdir()) == before
+
+
+def test_join_all_metrics_fills_missing_metrics(study_dir):
+    loader = MultiFileDataLoader(study_dir)
+    master = pd.DataFrame({
+        "subject_id": [101, 102, 103],
+        "site_id": ["A", "A", None],
+        "country": ["US", "US", None],
+        "region": [None, None, None],
+        "subject_status": ["Enrolled"] * 3,
+        "study_id": STUDY,
+    })
+    missing_visits = pd.DataFrame({"subject_id": ["101", "999"], "missing_visits": [2, 5]})
+    open_queries = pd.DataFrame({"subject_id": [102], "open_queries": [4.0]})
+    empty = {
+        name: pd.DataFrame(columns=["subject_id", name])
+        for name in ("missing_pages", "pending_sdv", "open_safety_issues")
+    }
+
+    joined = loader._join_all_metrics(
+        master, missing_visits, empty["missing_pages"], open_queries,
+        empty["pending_sdv"], empty["open_safety_issues"]
+    )
+
+    assert list(joined.columns) == [
+        *master.columns, "missing_visits", "missing_pages", "open_queries",
+        "pending_sdv", "open_safety_issues",
+    ]
+    # Integer and string subject ids meet on their string form; unknown ids are dropped
+    assert joined["subject_id"].astype(str).tolist() == ["101", "102", "103"]
+    assert joined["missing_visits"].tolist() == [2, 0, 0]
+    assert joined["open_queries"].tolist() == [0, 4, 0]
+    assert joined["missing_pages"].tolist() == [0, 0, 0]
+    assert (joined[["missing_visits", "open_queries", "pending_sdv"]].dtypes == int).all()
+    # Attribute columns keep their dtype, so new labels can be written
+    joined["site_id"] = joined["site_id"].fillna("Unknown")
+    assert joined["site_id"].tolist() == ["A", "A", "Unknown"]
+    assert joined["subject_id"].dtype == object
+
+
+def test_metric_output_dtypes_are_numpy_backed(study_dir):
+    all_data = {STUDY: MultiFileDataLoader(study_dir).load_study_data(STUDY)}
+    engine = MetricsEngine(CanonicalDataModel().build_canonical_model(all_data), all_data)
+    metrics = engine.calculate_all_metrics_for_study(STUDY)
+    subject_metrics = DataQualityIndex().calculate_subject_dqi(metrics["subject_metrics"])
+    site_metrics = metrics["site_metrics"]
+
+    for col in ("subject_id", "site_id", "country", "region", "study_id", "risk_level"):
+        assert subject_metrics[col].dtype == object, col
+    for col in ("missing_visits", "missing_pages", "open_queries", "pending_sdv", "open_safety_issues"):
+        assert subject_metrics[col].dtype == "int64", col
+    assert subject_metrics["is_clean_patient"].dtype == bool
+    assert subject_metrics["dqi_score"].dtype == "float64"
+
+    assert site_metrics["site_id"].dtype == object
+    assert site_metrics["study_id"].dtype == object
+    for col in ("subject_count", "total_missing_visits", "total_missing_pages", "total_open_queries"):
+        assert site_metrics[col].dtype == "int64", col
+    assert site_metrics["performance_score"].dtype == "float64"
+
+
+def _load_with_engine(study_dir, monkeypatch, engine):
+    monkeypatch.setattr(multi_file_loader, "EXCEL_ENGINE", engine)
+    loader = MultiFileDataLoader(study_dir)
+    reports = sorted((study_dir / STUDY).glob("*.xlsx"))
+    return {path.name: loader._read_excel(path) for path in reports}, loader.load_study_data(STUDY)
+
+
+def test_calamine_reads_match_openpyxl(study_dir, monkeypatch):
+    pytest.importorskip("python_calamine")
+    # A blank header and empty cells in the master and query reports
+    pd.DataFrame({
+        "Subject ID": ["S1", "S2", "S3"],
+        "Site ID": ["Site 1", None, "Site 2"],
+        "Country": ["US", "US", None],
+        "Region": [None, "NA", "EU"],
+        "Subject Status": ["Enrolled", "Enrolled", "Screening"],
+        "SDV Pending Pages": [0, None, 1],
+        "": [None, "x", None],
+    }).to_excel(study_dir / STUDY / f"{STUDY}_CPID_EDC_Metrics.xlsx", index=False)
+    pd.DataFrame({
+        "Subject": ["S2", None, "S3"],
+        "Total Open issue Count per subject": [3, None, None],
+        "Comment": ["a", "b", None],
+    }).to_excel(study_dir / STUDY / f"{STUDY}_Compiled_EDRR.xlsx", index=False)
+
+    expected_reports, expected = _load_with_engine(study_dir, monkeypatch, "openpyxl")
+    actual_reports, actual = _load_with_engine(study_dir, monkeypatch, "calamine")
+
+    assert list(actual_reports) == list(expected_reports)
+    for name, df in expected_reports.items():
+        assert list(actual_reports[name].columns) == list(df.columns), name
+        pd.testing.assert_frame_equal(actual_reports[name].isna(), df.isna(), obj=name)
+        pd.testing.assert_frame_equal(actual_reports[name], df, obj=name)
+    pd.testing.assert_frame_equal(actual, expected)
@@ -0,0 +1,59 @@
+"""Unit tests for the dashboard's partial top-k helper against pandas nlargest/nsmallest"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(SRC / "dashboard"))
+
+from app import _topk, _top_above  # noqa: E402
+
+
+def _frame(rng, n):
+    """Small frame with many ties, some NaN and a non-default index"""
+    values = rng.integers(0, 6, n).astype(float)
+    values[rng.random(n) < 0.2] = np.nan
+    return pd.DataFrame({"v": values, "row": np.arange(n)}, index=rng.permutation(n) * 3)
+
+
+@pytest.mark.parametrize("largest", [False, True])
+def test_topk_matches_pandas_when_k_is_below_length(largest):
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n = int(rng.integers(1, 30))
+        df = _frame(rng, n)
+        k = int(rng.integers(1, n + 1)) if n > 1 else 1
+        if k >= n:
+            continue
+        expected = df.nlargest(k, "v") if largest else df.nsmallest(k, "v")
+        pd.testing.assert_frame_equal(_topk(df, "v", k, largest=largest), expected)
+
+
+@pytest.mark.parametrize("largest", [False, True])
+def test_topk_keeps_tie_order_when_k_covers_frame(largest):
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        n = int(rng.integers(0, 20))
+        df = _frame(rng, n)
+        k = n + int(rng.integers(0, 5))
+        result = _topk(df, "v", k, largest=largest)
+        expected = df.nlargest(k, "v") if largest else df.nsmallest(k, "v")
+        # Same values as pandas; ties stay in their original row order
+        np.testing.assert_array_equal(result["v"].to_numpy(), expected["v"].to_numpy())
+        pd.testing.assert_frame_equal(result, df.sort_values("v", ascending=not largest, kind="stable"))
+
+
+def test_topk_ranks_non_numeric_values_as_missing():
+    df = pd.DataFrame({"v": [3, "n/a", 1, None, 2], "row": range(5)})
+    assert _topk(df, "v", 2)["row"].tolist() == [2, 4]
+    assert _topk(df, "v", 2, largest=True)["row"].tolist() == [0, 4]
+    assert _topk(df, "v", 10)["row"].tolist() == [2, 4, 0, 1, 3]
+
+
+def test_top_above_filters_then_ranks():
+    df = pd.DataFrame({"v": [5.0, 1.0, 7.0, 5.0, np.nan], "row": range(5)})
+    assert _top_above(df, "v", 5, 2)["row"].tolist() == [2, 0]